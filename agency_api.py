@@ -1,36 +1,97 @@
 import os
 from flask import (
+    Blueprint,
     Flask,
+    Response,
     request,
-    jsonify,
     abort,
-    make_response
+    make_response,
+    stream_with_context
+)
+from sqlalchemy import (
+    and_,
+    exc
 )
-from sqlalchemy import exc
 import json
 from flask_cors import (
     CORS,
     cross_origin
 )
+from werkzeug.exceptions import HTTPException
 from database.models import (
     db_drop_and_create_all,
     setup_db,
+    cached_count,
+    register_write_listener,
+    table_versions,
     db,
     Actor,
+    Cast,
     Movie
 )
+from database.importer import (
+    IMPORT_CHUNK_SIZE,
+    IMPORT_FORMATS,
+    ImportFailed,
+    import_rows
+)
+from database.search import search_select
+from database.pool import (
+    pool_stats,
+    warm_pool
+)
+from database.replicas import (
+    LAST_WRITE_HEADER,
+    install_read_your_writes,
+    pin_writer,
+    reads_from_replica
+)
+from database.stats import summary as stats_summary
+from database.pagination import (
+    keyset_page,
+    offset_page,
+    sort_column
+)
 from auth.auth import (
     AuthError,
-    requires_auth
+    configure_auth,
+    jwks_cache,
+    requires_auth,
+    token_cache
+)
+from utils.json_encoder import (
+    dumps,
+    jsonify
 )
+from utils.compression import install_compression
+from utils.response_cache import create_response_cache
 import sys
+import csv
+import io
 import datetime
+import hashlib
+import operator
+import time
 import traceback
+from functools import wraps
 
-app = Flask(__name__)
-setup_db(app)
+# the routes, registered on an application by create_app()
+api = Blueprint('api', __name__)
+response_cache = create_response_cache()
+register_write_listener(response_cache.invalidate)
+register_write_listener(pin_writer)
 GENDER_SET = set(['M', 'F'])  # define gender values
+MAX_AGE = 2 ** 31 - 1  # largest INTEGER of the database
+MAX_TEXT_LENGTH = 100  # length of the name and title columns
 MODELS_PER_PAGE = 10  # for paging result
+MAX_MODELS_PER_PAGE = 100  # upper bound of per_page
+BULK_MAX_ITEMS = 1000  # upper bound of items in a bulk request
+BATCH_MAX_IDS = 100  # upper bound of ids in GET /<models>?ids=
+EXPORT_CHUNK_SIZE = 1000  # rows read from the database at a time
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
 
 '''
     Formatting & Validatinga Date
@@ -55,6 +116,8 @@ def format_date(date_str, date_format='%Y-%m-%d'):
 
 def format_age(age):
     try:
+        if isinstance(age, bool):
+            raise TypeError(f'age is a boolean: {age}')
         age = int(age)
     except Exception:
         print(sys.exc_info())
@@ -62,6 +125,8 @@ def format_age(age):
 
     if age < 0:
         abort(status=400, description='age must be Pos. Integer (0 > age)')
+    if age > MAX_AGE:
+        abort(status=400, description=f'age must be at most {MAX_AGE}')
 
     return age
 
@@ -72,6 +137,8 @@ def format_age(age):
 
 
 def format_gender(gender):
+    if not isinstance(gender, str):
+        abort(status=400, description='gender must be "M" or "F"')
     gender = gender.upper()
     if gender not in GENDER_SET:
         abort(status=400, description='gender must be "M" or "F"')
@@ -80,10 +147,634 @@ def format_gender(gender):
 
 
 '''
-    Set up CORS. Allow '*' for origins.
-    Delete the sample route after completing the TODOs
+    Formatting & Validating a Name or Title
+        a non-empty string of at most MAX_TEXT_LENGTH characters
+'''
+
+
+def format_text(value, field):
+    if not isinstance(value, str) or not value.strip():
+        abort(status=400, description=f'{field} must be a non-empty String')
+    if len(value) > MAX_TEXT_LENGTH:
+        abort(status=400, description=f'{field} must have at most '
+                                      f'{MAX_TEXT_LENGTH} characters')
+
+    return value
+
+
+'''
+    Validating a new Actor
+        returns the column values of the actor
+'''
+
+
+def validate_actor(values):
+    name = values['name'] if 'name' in values \
+        else abort(400, 'name is empty')
+    age = values['age'] if 'age' in values \
+        else abort(400, 'age is empty')
+    gender = values['gender'] if 'gender' in values \
+        else abort(400, 'gender is emtpy')
+
+    return {
+        'name': format_text(name, 'name'),
+        'age': format_age(age),
+        'gender': format_gender(gender)
+    }
+
+
+'''
+    Validating a new Movie
+        returns the column values of the movie
+'''
+
+
+def validate_movie(values):
+    title = values['title'] if 'title' in values \
+        else abort(400, description='title is empty')
+    release_date = format_date(values['release_date']) \
+        if 'release_date' in values \
+        else abort(400, description='release_date is empty')
+
+    return {
+        'title': format_text(title, 'title'),
+        'release_date': release_date
+    }
+
+
+'''
+    Validating Changes of an Actor
+        returns the changed column values
+'''
+
+
+def validate_actor_changes(values):
+    changes = {}
+    if 'name' in values:
+        changes['name'] = format_text(values['name'], 'name')
+    if 'age' in values:
+        changes['age'] = format_age(values['age'])
+    if 'gender' in values:
+        changes['gender'] = format_gender(values['gender'])
+    if not changes:
+        abort(400, description='changes are empty')
+
+    return changes
+
+
+'''
+    Validating Changes of a Movie
+        returns the changed column values
+'''
+
+
+def validate_movie_changes(values):
+    changes = {}
+    if 'title' in values:
+        changes['title'] = format_text(values['title'], 'title')
+    if 'release_date' in values:
+        changes['release_date'] = format_date(values['release_date'])
+    if not changes:
+        abort(400, description='changes are empty')
+
+    return changes
+
+
+'''
+    Validating a Cast item
+        returns the (movie_id, actor_id) pair
+'''
+
+
+def validate_cast(values):
+    if 'movie_id' not in values or 'actor_id' not in values:
+        abort(400, description='movie_id and actor_id are mandatory')
+    movie_id, actor_id = format_ids([values['movie_id'], values['actor_id']])
+
+    return movie_id, actor_id
+
+
+'''
+    Formatting & Validating a List of IDs
+'''
+
+
+def format_ids(ids):
+    if not isinstance(ids, list) or not ids:
+        abort(400, description='ids must be a non-empty list')
+    if len(ids) > BULK_MAX_ITEMS:
+        abort(400, description=f'ids must have at most '
+                               f'{BULK_MAX_ITEMS} items')
+    try:
+        ids = [int(id) for id in ids]
+    except Exception:
+        print(sys.exc_info())
+        abort(400, description='ids must be Integers')
+
+    return ids
+
+
+'''
+    Reading & Validating the Changes of a Bulk Update
+        the body is either
+            {"ids": [ids], "changes": {changes}} (same changes for all) or
+            a list of {"id": id, "changes": {changes}} (or {name: [...]})
+        returns (changes_by_id, errors), errors list
+        the invalid items by index
+'''
+
+
+def get_bulk_changes(name, validate):
+    request_json = request.get_json()
+    if isinstance(request_json, dict) and 'ids' in request_json:
+        ids = format_ids(request_json['ids'])
+        changes = request_json.get('changes')
+        changes = validate(changes if isinstance(changes, dict) else {})
+        return {id: changes for id in ids}, []
+
+    items = request_json.get(name) if isinstance(request_json, dict) \
+        else request_json
+    if not isinstance(items, list) or not items:
+        abort(400, description=f'{name} must be a non-empty list')
+    if len(items) > BULK_MAX_ITEMS:
+        abort(400, description=f'{name} must have at most '
+                               f'{BULK_MAX_ITEMS} items')
+
+    changes_by_id = {}
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict) or \
+                    not isinstance(item.get('changes'), dict):
+                abort(400, description='item must be '
+                                       '{"id": id, "changes": {changes}}')
+            id = format_ids([item.get('id')])[0]
+            if id in changes_by_id:
+                abort(400, description=f'id {id} is duplicated')
+            changes_by_id[id] = validate(item['changes'])
+        except HTTPException as e:
+            errors.append({'index': index, 'message': e.description})
+
+    return changes_by_id, errors
+
+
+'''
+    Reading & Validating the Items of a Bulk Request
+        the body is a list of items (or {name: [items]})
+        returns (rows, errors), errors list the invalid items by index
+'''
+
+
+def get_bulk_items(name, validate):
+    request_json = request.get_json()
+    items = request_json.get(name) if isinstance(request_json, dict) \
+        else request_json
+    if not isinstance(items, list) or not items:
+        abort(400, description=f'{name} must be a non-empty list')
+    if len(items) > BULK_MAX_ITEMS:
+        abort(400, description=f'{name} must have at most '
+                               f'{BULK_MAX_ITEMS} items')
+
+    rows = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                abort(400, description='item must be an object')
+            rows.append(validate(item))
+        except HTTPException as e:
+            errors.append({'index': index, 'message': e.description})
+
+    return rows, errors
+
+
+'''
+    Filters of the list endpoints
+        argument: (column, comparison, validation)
+        min_* and max_* bounds are inclusive
 '''
-cors = CORS(app, resources={r"/*": {"origins": "*"}})
+FILTERS = {
+    Actor: {
+        'gender': (Actor.gender, operator.eq, format_gender),
+        'min_age': (Actor.age, operator.ge, format_age),
+        'max_age': (Actor.age, operator.le, format_age)
+    },
+    Movie: {
+        'min_release_date': (Movie.release_date, operator.ge,
+                             lambda value: format_date(value).date()),
+        'max_release_date': (Movie.release_date, operator.le,
+                             lambda value: format_date(value).date())
+    }
+}
+
+
+'''
+    Related rows of the list endpoints (?include=)
+        name: the model cast with the listed one
+'''
+INCLUDES = {
+    Actor: {'movies': Movie},
+    Movie: {'cast': Actor}
+}
+
+
+'''
+    Reading & Validating Include Arguments
+        returns the names of ?include= (comma separated)
+'''
+
+
+def get_includes(model):
+    names = [name.strip() for name in request.args.get('include', '')
+             .split(',') if name.strip()]
+    unknown = [name for name in names if name not in INCLUDES[model]]
+    if unknown:
+        abort(400, description='unknown include: {}. include must be '
+                               'among {}'.format(', '.join(unknown),
+                                                 ', '.join(INCLUDES[model])))
+
+    return list(dict.fromkeys(names))
+
+
+'''
+    Adding the Related rows of ?include= to listed items
+        one query per include, whatever the number of items
+'''
+
+
+def include_related(model, rows, items):
+    for name in get_includes(model):
+        related_model = INCLUDES[model][name]
+        related = Cast.related(related_model, [row.id for row in rows],
+                               related_model.FIELDS)
+        for row, item in zip(rows, items):
+            item[name] = related[row.id]
+
+    return items
+
+
+'''
+    Reading & Validating Filter Arguments
+        returns (criteria, key), the filter criteria of the model and
+        a key of the filter values (None without filters)
+'''
+
+
+def get_filters(model):
+    criteria = []
+    values = {}
+    for name, (column, compare, validate) in FILTERS[model].items():
+        if name in request.args:
+            values[name] = validate(request.args[name])
+            criteria.append(compare(column, values[name]))
+
+    for name, value in values.items():
+        upper = 'max_' + name[len('min_'):]
+        if name.startswith('min_') and upper in values and \
+                value > values[upper]:
+            abort(400, description=f'{name} must not be greater than '
+                                   f'{upper}')
+
+    key = tuple(sorted((name, str(value)) for name, value in values.items()))
+    return criteria, key or None
+
+
+'''
+    Reading & Validating Paging Arguments
+'''
+
+
+def get_page_args():
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', MODELS_PER_PAGE, type=int)
+    if page < 1:
+        abort(status=400, description='page must be Pos. Integer (0 < page)')
+    if per_page < 1 or per_page > MAX_MODELS_PER_PAGE:
+        abort(status=400,
+              description='per_page must be between 1 and {}'.format(
+                  MAX_MODELS_PER_PAGE))
+
+    return page, per_page
+
+
+'''
+    Reading & Validating a Sparse Fieldset
+        ?fields=id,name lists the json fields to return
+        (all the fields of the model by default)
+'''
+
+
+def get_fields(model):
+    fields = request.args.get('fields')
+    if fields is None:
+        return model.FIELDS
+
+    fields = tuple(dict.fromkeys(
+        field.strip() for field in fields.split(',') if field.strip()))
+    if not fields:
+        abort(400, description='fields must not be empty')
+    unknown = [field for field in fields if field not in model.FIELDS]
+    if unknown:
+        abort(400, description='unknown fields: {}. fields must be among '
+                               '{}'.format(', '.join(unknown),
+                                           ', '.join(model.FIELDS)))
+
+    return fields
+
+
+'''
+    Paginating a Model in the database
+        only the rows of the requested page are fetched.
+        with ?cursor= (empty for the first page) pages are sought by
+        (sort, id) keyset, otherwise ?page= is served by LIMIT/OFFSET.
+        only the columns of ?fields= (plus id and the sort key) are loaded.
+        the rows are filtered by the FILTERS arguments
+        and ?sort=-key sorts them in descending order.
+        ?include= adds the related rows of INCLUDES to each one.
+        the formatted rows are listed under name
+'''
+
+
+def paginate(model, name):
+    page, per_page = get_page_args()
+    fields = get_fields(model)
+    criteria, filter_key = get_filters(model)
+    sort = request.args.get('sort', 'id')
+    cursor = request.args.get('cursor')
+    try:
+        query = model.select_fields(fields, 'id', sort_column(model, sort).key)
+        if criteria:
+            query = query.where(and_(*criteria))
+        if cursor is not None:
+            selected, next_cursor = keyset_page(
+                model, per_page, sort=sort, cursor=cursor, query=query)
+        else:
+            selected, next_cursor = offset_page(
+                model, page, per_page, sort=sort, query=query)
+    except ValueError as e:
+        abort(status=400, description=str(e))
+
+    format_row = model.row_formatter(fields)
+    result = {
+        name: include_related(model, selected,
+                              [format_row(row) for row in selected]),
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'total': cached_count(model, criteria, filter_key)
+    }
+    if cursor is None:
+        result['page'] = page
+
+    return result
+
+
+'''
+    Fetching a Batch of a Model by ID in the database
+        ?ids=1,2,3 is served by a single IN (...) query
+        which loads only the columns of ?fields=, ?include= as for pages.
+        the formatted rows are listed under name in the requested order
+        and ids which do not exist are listed under missing
+'''
+
+
+def get_batch(model, name):
+    ids = [id for id in request.args.get('ids', '').split(',')
+           if id.strip()]
+    if len(ids) > BATCH_MAX_IDS:
+        abort(400, description=f'ids must have at most '
+                               f'{BATCH_MAX_IDS} items')
+    ids = list(dict.fromkeys(format_ids(ids)))  # drop duplicates
+    fields = get_fields(model)
+
+    found = {row.id: row for row in db.session.execute(
+        model.select_fields(fields, 'id').where(model.id.in_(ids)))}
+
+    rows = [found[id] for id in ids if id in found]
+    format_row = model.row_formatter(fields)
+    return {
+        name: include_related(model, rows,
+                              [format_row(row) for row in rows]),
+        'missing': [id for id in ids if id not in found]
+    }
+
+
+'''
+    Searching a Model in the database
+        ?q= is matched by the full-text index of the model
+        (every word, the last one as a prefix), best match first.
+        ?page= and ?per_page= page the results, ?fields= selects the
+        returned fields. the formatted rows are listed under name
+'''
+
+
+def search_table(model, name):
+    page, per_page = get_page_args()
+    fields = get_fields(model)
+    try:
+        query = search_select(model, request.args.get('q'), fields)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    rows = db.session.execute(
+        query.limit(per_page + 1).offset((page - 1) * per_page)).fetchall()
+    format_row = model.row_formatter(fields)
+    return {
+        name: [format_row(row) for row in rows[:per_page]],
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page
+    }
+
+
+'''
+    Fetching a Model by ID in the database
+        loads only the columns of ?fields=
+        returns the formatted row or aborts with 404
+'''
+
+
+def get_item(model, id):
+    fields = get_fields(model)
+    try:
+        id = int(id)
+    except Exception:
+        print(sys.exc_info())
+        abort(404)
+
+    row = db.session.execute(
+        model.select_fields(fields).where(model.id == id)).first()
+    if row is None:
+        abort(404)
+
+    return model.row_formatter(fields)(row)
+
+
+'''
+    Fetching the rows of a Model cast with a row of another Model
+        the rows of related_model (columns of ?fields=) are listed
+        under name, or it aborts with 404 if the row does not exist
+'''
+
+
+def get_related(model, id, related_model, name):
+    fields = get_fields(related_model)
+    try:
+        id = int(id)
+    except Exception:
+        print(sys.exc_info())
+        abort(404)
+    if not model.existing_ids([id]):
+        abort(404)
+
+    return {name: Cast.related(related_model, [id], fields)[id]}
+
+
+'''
+    Streaming a whole Model table
+        rows are read with a Core select through a server-side cursor
+        (stream_results) and written out EXPORT_CHUNK_SIZE rows at a time,
+        so memory stays flat whatever the table size.
+        ?format= is ndjson (default) or csv
+'''
+
+
+def export_table(model, name):
+    format = request.args.get('format', 'ndjson')
+    if format not in EXPORT_FORMATS:
+        abort(400, description='format must be one of {}'.format(
+            ', '.join(EXPORT_FORMATS)))
+
+    def generate():
+        result = db.session.execute(
+            model.select_fields(model.FIELDS).order_by(model.id)
+            .execution_options(stream_results=True))
+        format_row = model.row_formatter(model.FIELDS)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == 'csv':
+            writer.writerow(model.FIELDS)
+        while True:
+            rows = result.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            if format == 'csv':
+                for row in rows:
+                    writer.writerow(format_row(row).values())
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield b''.join(dumps(format_row(row), sort_keys=False) +
+                               b'\n' for row in rows)
+        yield buffer.getvalue()
+
+    response = Response(stream_with_context(generate()),
+                        mimetype=EXPORT_FORMATS[format])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename={name}.{format}'
+    return response
+
+
+'''
+    Importing a Stream of rows into a Model table
+        the request body (NDJSON or CSV, ?format=) is parsed as a stream
+        and committed every ?chunk_size= valid rows.
+        ?resume_from= skips the input rows committed by a previous import
+'''
+
+
+def import_table(model, validate):
+    format = request.args.get('format', 'ndjson')
+    chunk_size = request.args.get('chunk_size', IMPORT_CHUNK_SIZE, type=int)
+    resume_from = request.args.get('resume_from', 0, type=int)
+    if format not in IMPORT_FORMATS:
+        abort(400, description='format must be one of {}'.format(
+            ', '.join(IMPORT_FORMATS)))
+    if chunk_size < 1 or chunk_size > BULK_MAX_ITEMS * 10:
+        abort(400, description='chunk_size must be between 1 and {}'.format(
+            BULK_MAX_ITEMS * 10))
+    if resume_from < 0:
+        abort(400, description='resume_from must be Pos. Integer')
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        report = import_rows(model, stream, format, validate,
+                             chunk_size=chunk_size, resume_from=resume_from)
+    except ImportFailed as e:
+        # the report tells where to resume from (committed)
+        return jsonify({
+            "success": False,
+            "error": e.status,
+            "message": e.message,
+            **e.report
+        }), e.status
+    finally:
+        db.session.close()
+
+    return jsonify({"success": True, **report})
+
+
+'''
+    Conditional & Cached GET
+        the strong ETag of a response is derived from the path, the query
+        string and the versions of the tables it reads. a request whose
+        If-None-Match matches is answered with 304 before the tables
+        are queried or anything is serialized.
+        other (non-streamed) responses are cached under their ETag
+        in response_cache until one of their tables is written.
+        they are tagged with cache_tags, so their compressed bodies
+        are cached too.
+        includes: the models read by each ?include= name
+'''
+
+
+def make_etag(models):
+    versions = table_versions(*(model.__tablename__ for model in models))
+    key = json.dumps([request.path,
+                      sorted(request.args.items(multi=True)),
+                      sorted(versions.items())])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def conditional_get(*models, includes=None):
+    def conditional_get_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            read = list(models)
+            if includes is not None:
+                for name in request.args.get('include', '').split(','):
+                    if name.strip() in includes:
+                        read += [includes[name.strip()], Cast]
+            read = list(dict.fromkeys(read))
+
+            etag = make_etag(read)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            tables = [model.__tablename__ for model in read]
+            cached = response_cache.get(tables, etag)
+            if cached is not None:
+                mimetype, body = cached.split(b'\n', 1)
+                response = Response(body, mimetype=mimetype.decode('ascii'))
+                response.set_etag(etag)
+                response.cache_tags = (tables, etag)
+                return response
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                if not response.is_streamed:
+                    response_cache.set(tables, etag,
+                                       response.mimetype.encode('ascii') +
+                                       b'\n' + response.get_data())
+                    response.cache_tags = (tables, etag)
+            return response
+
+        return wrapper
+    return conditional_get_decorator
+
 
 '''
     Use the after_request decorator to set Access-Control-Allow
@@ -91,10 +782,11 @@ cors = CORS(app, resources={r"/*": {"origins": "*"}})
 # CORS Headers
 
 
-@app.after_request
+@api.after_app_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Headers',
-                         'Content-Type,Authorization,true')
+                         f'Content-Type,Authorization,{LAST_WRITE_HEADER},'
+                         'true')
     response.headers.add('Access-Control-Allow-Methods',
                          'GET,PATCH,POST,DELETE,OPTIONS')
     return response
@@ -107,35 +799,68 @@ def after_request(response):
 '''
 
 
-@app.route('/', methods=['GET'])
+@api.route('/', methods=['GET'])
 def index():
     return jsonify({
         'message': 'Welcome to My Agency API'
     })
 
 
+'''
+    GET /metrics
+        return cache and connection pool counters for sizing
+'''
+
+
+@api.route('/metrics', methods=['GET'])
+@requires_auth('get:metrics')
+def get_metrics(payload):
+    return jsonify({
+        'success': True,
+        'token_cache': token_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'database_pool': pool_stats(db.engine)
+    })
+
+
+'''
+    GET /stats
+        return the summary statistics of actors and movies
+        (maintained on write, no table is scanned)
+'''
+
+
+@api.route('/stats', methods=['GET'])
+@requires_auth('get:actors')
+@cross_origin()
+@conditional_get(Actor, Movie)
+def get_stats(payload):
+    return jsonify({
+        'success': True,
+        'actors': stats_summary(Actor),
+        'movies': stats_summary(Movie)
+    })
+
+
 '''
     GET /actors
         return actor lists
 '''
 
 
-@app.route('/actors', methods=['GET'])
+@api.route('/actors', methods=['GET'])
 @requires_auth('get:actors')
 @cross_origin()
+@reads_from_replica
+@conditional_get(Actor, includes=INCLUDES[Actor])
 def get_actors(payload):
-    if request:
-        page = request.args.get('page', 1, type=int)
+    if 'ids' in request.args:
+        selected = get_batch(Actor, 'actors')
     else:
-        page = 1
-    start = (page - 1) * MODELS_PER_PAGE
-    end = start + MODELS_PER_PAGE
+        selected = paginate(Actor, 'actors')
+    selected['success'] = True
 
-    actors = Actor.query.all()
-    formatted_actors = [actor.format() for actor in actors]
-    current_selected = formatted_actors[start:end]
-
-    return jsonify({"success": True, "actors": current_selected})
+    return jsonify(selected)
 
 
 '''
@@ -144,22 +869,147 @@ def get_actors(payload):
 '''
 
 
-@app.route('/movies', methods=['GET'])
+@api.route('/movies', methods=['GET'])
 @requires_auth('get:movies')
 @cross_origin()
+@reads_from_replica
+@conditional_get(Movie, includes=INCLUDES[Movie])
 def get_movies(payload):
-    if request:
-        page = request.args.get('page', 1, type=int)
+    if 'ids' in request.args:
+        selected = get_batch(Movie, 'movies')
     else:
-        page = 1
-    start = (page - 1) * MODELS_PER_PAGE
-    end = start + MODELS_PER_PAGE
+        selected = paginate(Movie, 'movies')
+    selected['success'] = True
+
+    return jsonify(selected)
+
+
+'''
+    GET /actors/search
+        return the actors whose name matches ?q=
+'''
 
-    movies = Movie.query.all()
-    formatted_movies = [movie.format() for movie in movies]
-    current_selected = formatted_movies[start:end]
 
-    return jsonify({"success": True, "movies": current_selected})
+@api.route('/actors/search', methods=['GET'])
+@requires_auth('get:actors')
+@cross_origin()
+@reads_from_replica
+@conditional_get(Actor)
+def search_actors(payload):
+    selected = search_table(Actor, 'actors')
+    selected['success'] = True
+
+    return jsonify(selected)
+
+
+'''
+    GET /movies/search
+        return the movies whose title matches ?q=
+'''
+
+
+@api.route('/movies/search', methods=['GET'])
+@requires_auth('get:movies')
+@cross_origin()
+@reads_from_replica
+@conditional_get(Movie)
+def search_movies(payload):
+    selected = search_table(Movie, 'movies')
+    selected['success'] = True
+
+    return jsonify(selected)
+
+
+'''
+    GET /actors/<id>
+        return an actor
+'''
+
+
+@api.route('/actors/<id>', methods=['GET'])
+@requires_auth('get:actors')
+@cross_origin()
+@conditional_get(Actor)
+def get_actor(payload, id):
+    return jsonify({"success": True, "actor": get_item(Actor, id)})
+
+
+'''
+    GET /movies/<id>
+        return a movie
+'''
+
+
+@api.route('/movies/<id>', methods=['GET'])
+@requires_auth('get:movies')
+@cross_origin()
+@conditional_get(Movie)
+def get_movie(payload, id):
+    return jsonify({"success": True, "movie": get_item(Movie, id)})
+
+
+'''
+    GET /movies/<id>/cast
+        return the actors cast in a movie
+'''
+
+
+@api.route('/movies/<id>/cast', methods=['GET'])
+@requires_auth('get:movies')
+@cross_origin()
+@conditional_get(Movie, Actor, Cast)
+def get_movie_cast(payload, id):
+    selected = get_related(Movie, id, Actor, 'cast')
+    selected['success'] = True
+
+    return jsonify(selected)
+
+
+'''
+    GET /actors/<id>/movies
+        return the movies an actor is cast in
+'''
+
+
+@api.route('/actors/<id>/movies', methods=['GET'])
+@requires_auth('get:actors')
+@cross_origin()
+@conditional_get(Actor, Movie, Cast)
+def get_actor_movies(payload, id):
+    selected = get_related(Actor, id, Movie, 'movies')
+    selected['success'] = True
+
+    return jsonify(selected)
+
+
+'''
+    GET /actors/export
+        stream all actors as NDJSON or CSV
+'''
+
+
+@api.route('/actors/export', methods=['GET'])
+@requires_auth('get:actors')
+@cross_origin()
+@reads_from_replica
+@conditional_get(Actor)
+def export_actors(payload):
+    return export_table(Actor, 'actors')
+
+
+'''
+    GET /movies/export
+        stream all movies as NDJSON or CSV
+'''
+
+
+@api.route('/movies/export', methods=['GET'])
+@requires_auth('get:movies')
+@cross_origin()
+@reads_from_replica
+@conditional_get(Movie)
+def export_movies(payload):
+    return export_table(Movie, 'movies')
 
 
 '''
@@ -168,31 +1018,19 @@ def get_movies(payload):
 '''
 
 
-@app.route('/actors', methods=['POST'])
+@api.route('/actors', methods=['POST'])
 @requires_auth('post:actors')
 @cross_origin()
 def post_actors(payload):
 
     error = False
 
-    # get new values
-    request_json = request.get_json()
-    name = request_json['name'] if 'name' in request_json \
-        else abort(400, 'name is empty')
-    age = request_json['age'] if 'age' in request_json \
-        else abort(400, 'age is empty')
-    gender = request_json['gender'] if 'gender' in request_json \
-        else abort(400, 'gender is emtpy')
-
-    # validate age value
-    age = format_age(age)
-
-    # validate gender value (M,F)
-    gender = format_gender(gender)
+    # get & validate new values (age: Pos. Integer, gender: M,F)
+    values = validate_actor(request.get_json())
 
     try:
         # create a new row in the drinks table
-        actor = Actor(name=name, age=age, gender=gender)
+        actor = Actor(**values)
         actor.insert()
         formatted_actor = actor.format()
     except Exception:
@@ -214,23 +1052,18 @@ def post_actors(payload):
 '''
 
 
-@app.route('/movies', methods=['POST'])
+@api.route('/movies', methods=['POST'])
 @requires_auth('post:movies')
 @cross_origin()
 def post_movies(payload):
 
     error = False
-    # get new values
-    request_json = request.get_json()
-    title = request_json['title'] if 'title' in request_json \
-        else abort(400, description='title is empty')
-    release_date = format_date(request_json['release_date']) \
-        if 'release_date' in request_json \
-        else abort(400, description='release_date is empty')
+    # get & validate new values
+    values = validate_movie(request.get_json())
     try:
 
         # create a new row in the drinks table
-        movie = Movie(title=title, release_date=release_date)
+        movie = Movie(**values)
         movie.insert()
         formatted_movie = movie.format()
     except Exception:
@@ -246,13 +1079,256 @@ def post_movies(payload):
         return jsonify({"success": True, "movie": formatted_movie})
 
 
+'''
+    POST /actors/bulk
+        add new Actors with one statement and one commit
+'''
+
+
+@api.route('/actors/bulk', methods=['POST'])
+@requires_auth('post:actors')
+@cross_origin()
+def post_actors_bulk(payload):
+    rows, errors = get_bulk_items('actors', validate_actor)
+    if errors:
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": "invalid actors",
+            "errors": errors
+        }), 400
+
+    try:
+        Actor.bulk_insert(rows)
+    except Exception:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return jsonify({"success": True, "created": len(rows)})
+
+
+'''
+    POST /movies/bulk
+        add new Movies with one statement and one commit
+'''
+
+
+@api.route('/movies/bulk', methods=['POST'])
+@requires_auth('post:movies')
+@cross_origin()
+def post_movies_bulk(payload):
+    rows, errors = get_bulk_items('movies', validate_movie)
+    if errors:
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": "invalid movies",
+            "errors": errors
+        }), 400
+
+    try:
+        Movie.bulk_insert(rows)
+    except Exception:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return jsonify({"success": True, "created": len(rows)})
+
+
+'''
+    POST /actors/import
+        add actors from an NDJSON or CSV stream
+'''
+
+
+@api.route('/actors/import', methods=['POST'])
+@requires_auth('post:actors')
+@cross_origin()
+def import_actors(payload):
+    return import_table(Actor, validate_actor)
+
+
+'''
+    POST /movies/import
+        add movies from an NDJSON or CSV stream
+'''
+
+
+@api.route('/movies/import', methods=['POST'])
+@requires_auth('post:movies')
+@cross_origin()
+def import_movies(payload):
+    return import_table(Movie, validate_movie)
+
+
+'''
+    Reading & Validating the pairs of a Cast request
+        the body is a list of {"movie_id": id, "actor_id": id}
+        (or {"cast": [...]}) whose movies and actors must exist
+        returns the pairs, or the 400 response listing the invalid ones
+'''
+
+
+def get_cast_pairs():
+    pairs, errors = get_bulk_items('cast', validate_cast)
+    if not errors:
+        movie_ids = Movie.existing_ids(movie_id for movie_id, _ in pairs)
+        actor_ids = Actor.existing_ids(actor_id for _, actor_id in pairs)
+        for index, (movie_id, actor_id) in enumerate(pairs):
+            if movie_id not in movie_ids:
+                errors.append({'index': index,
+                               'message': f'movie {movie_id} does not exist'})
+            elif actor_id not in actor_ids:
+                errors.append({'index': index,
+                               'message': f'actor {actor_id} does not exist'})
+    if errors:
+        return None, (jsonify({
+            "success": False,
+            "error": 400,
+            "message": "invalid cast",
+            "errors": errors
+        }), 400)
+
+    return pairs, None
+
+
+'''
+    POST /movies/cast
+        cast many actors in movies in one transaction
+'''
+
+
+@api.route('/movies/cast', methods=['POST'])
+@requires_auth('patch:movies')
+@cross_origin()
+def post_movies_cast(payload):
+    pairs, error = get_cast_pairs()
+    if error is not None:
+        return error
+
+    try:
+        cast = Cast.bulk_cast(pairs)
+    except Exception:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return jsonify({"success": True, "cast": cast})
+
+
+'''
+    DELETE /movies/cast
+        remove many actors from movies in one transaction
+'''
+
+
+@api.route('/movies/cast', methods=['DELETE'])
+@requires_auth('patch:movies')
+@cross_origin()
+def delete_movies_cast(payload):
+    pairs, error = get_cast_pairs()
+    if error is not None:
+        return error
+
+    try:
+        uncast = Cast.bulk_uncast(pairs)
+    except Exception:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return jsonify({"success": True, "uncast": uncast})
+
+
+'''
+    PATCH /actors/bulk
+        update many actors in one transaction
+'''
+
+
+@api.route('/actors/bulk', methods=['PATCH'])
+@requires_auth('patch:actors')
+@cross_origin()
+def patch_actors_bulk(payload):
+    changes_by_id, errors = get_bulk_changes('actors',
+                                             validate_actor_changes)
+    if errors:
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": "invalid actors",
+            "errors": errors
+        }), 400
+
+    try:
+        not_found = Actor.bulk_update(changes_by_id)
+    except Exception:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return jsonify({
+        "success": True,
+        "updated": sorted(set(changes_by_id) - set(not_found)),
+        "not_found": not_found
+    })
+
+
+'''
+    PATCH /movies/bulk
+        update many movies in one transaction
+'''
+
+
+@api.route('/movies/bulk', methods=['PATCH'])
+@requires_auth('patch:movies')
+@cross_origin()
+def patch_movies_bulk(payload):
+    changes_by_id, errors = get_bulk_changes('movies',
+                                             validate_movie_changes)
+    if errors:
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": "invalid movies",
+            "errors": errors
+        }), 400
+
+    try:
+        not_found = Movie.bulk_update(changes_by_id)
+    except Exception:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return jsonify({
+        "success": True,
+        "updated": sorted(set(changes_by_id) - set(not_found)),
+        "not_found": not_found
+    })
+
+
 '''
     PATCH /actors/<id>
         update actor info
 '''
 
 
-@app.route('/actors/<id>', methods=['PATCH'])
+@api.route('/actors/<id>', methods=['PATCH'])
 @requires_auth('patch:actors')
 @cross_origin()
 def patch_actors(payload, id):
@@ -269,7 +1345,7 @@ def patch_actors(payload, id):
     request_json = request.get_json()
     if 'name' in request_json:
         # update field values
-        name = request_json['name']
+        name = format_text(request_json['name'], 'name')
         actor.name = name
 
     if 'age' in request_json:
@@ -310,7 +1386,7 @@ def patch_actors(payload, id):
 '''
 
 
-@app.route('/movies/<id>', methods=['PATCH'])
+@api.route('/movies/<id>', methods=['PATCH'])
 @requires_auth('patch:movies')
 @cross_origin()
 def patch_movies(payload, id):
@@ -327,7 +1403,7 @@ def patch_movies(payload, id):
     request_json = request.get_json()
     if 'title' in request_json:
         # update field values
-        title = request_json['title']
+        title = format_text(request_json['title'], 'title')
         movie.title = title
 
     if 'release_date' in request_json:
@@ -357,7 +1433,7 @@ def patch_movies(payload, id):
 '''
 
 
-@app.route('/actors/<id>', methods=['DELETE'])
+@api.route('/actors/<id>', methods=['DELETE'])
 @requires_auth('delete:actors')
 @cross_origin()
 def delete_actors(payload, id):
@@ -382,7 +1458,7 @@ def delete_actors(payload, id):
 '''
 
 
-@app.route('/movies/<id>', methods=['DELETE'])
+@api.route('/movies/<id>', methods=['DELETE'])
 @requires_auth('delete:movies')
 @cross_origin()
 def delete_movies(payload, id):
@@ -401,12 +1477,70 @@ def delete_movies(payload, id):
     return jsonify({"success": success, "delete": id})
 
 
+'''
+    DELETE /actors/bulk
+        delete many actors by id in one transaction
+'''
+
+
+@api.route('/actors/bulk', methods=['DELETE'])
+@requires_auth('delete:actors')
+@cross_origin()
+def delete_actors_bulk(payload):
+    request_json = request.get_json(silent=True)
+    ids = format_ids(request_json.get('ids')
+                     if isinstance(request_json, dict) else None)
+    try:
+        not_found = Actor.bulk_delete(ids)
+    except Exception:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return jsonify({
+        "success": True,
+        "deleted": sorted(set(ids) - set(not_found)),
+        "not_found": not_found
+    })
+
+
+'''
+    DELETE /movies/bulk
+        delete many movies by id in one transaction
+'''
+
+
+@api.route('/movies/bulk', methods=['DELETE'])
+@requires_auth('delete:movies')
+@cross_origin()
+def delete_movies_bulk(payload):
+    request_json = request.get_json(silent=True)
+    ids = format_ids(request_json.get('ids')
+                     if isinstance(request_json, dict) else None)
+    try:
+        not_found = Movie.bulk_delete(ids)
+    except Exception:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    return jsonify({
+        "success": True,
+        "deleted": sorted(set(ids) - set(not_found)),
+        "not_found": not_found
+    })
+
+
 '''
     error handling
 '''
 
 
-@app.errorhandler(422)
+@api.app_errorhandler(422)
 def unprocessable(error):
     return jsonify({
         "success": False,
@@ -415,7 +1549,7 @@ def unprocessable(error):
     }), 422
 
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         "success": False,
@@ -424,7 +1558,7 @@ def not_found(error):
     }), 404
 
 
-@app.errorhandler(400)
+@api.app_errorhandler(400)
 def bad_request(error):
     return jsonify({
         "success": False,
@@ -433,7 +1567,7 @@ def bad_request(error):
     }), 400
 
 
-@app.errorhandler(405)
+@api.app_errorhandler(405)
 def method_not_allowed(error):
     return jsonify({
         "success": False,
@@ -442,10 +1576,106 @@ def method_not_allowed(error):
     }), 405
 
 
-@app.errorhandler(500)
+@api.app_errorhandler(413)
+def request_entity_too_large(error):
+    return jsonify({
+        "success": False,
+        "error": 413,
+        "message": error.description
+    }), 413
+
+
+@api.app_errorhandler(500)
 def internal_server_error(error):
     return jsonify({
         "success": False,
         "error": 500,
         "message": "internal server error"
     }), 500
+
+
+'''
+warmup(connections=1, flask_app=None)
+    prepares a worker before it accepts requests (see gunicorn.conf.py)
+        fetches the signing keys of Auth0
+        opens connections of the database pool
+        runs the list, search and stats queries once, which initializes
+        the dialect and the mappers and fills the count cache
+    flask_app defaults to the module-level app
+    returns the milliseconds spent by each step
+'''
+
+
+def warmup(connections=1, flask_app=None):
+    flask_app = flask_app or app
+    timings = {}
+
+    def timed(name, step):
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            print(sys.exc_info())
+        timings[name] = round((time.perf_counter() - start) * 1000, 3)
+
+    def queries():
+        for model, name in ((Actor, 'actors'), (Movie, 'movies')):
+            with flask_app.test_request_context(f'/{name}'):
+                make_etag([model])
+                paginate(model, name)
+            with flask_app.test_request_context(f'/{name}/search?q=warmup'):
+                search_table(model, name)
+            stats_summary(model)
+
+    timed('jwks', jwks_cache.refresh)
+    with flask_app.app_context():
+        timed('pool', lambda: warm_pool(db.engine, connections))
+        timed('queries', queries)
+        db.session.remove()
+    return timings
+
+
+'''
+create_app(config=None)
+    returns an application serving the API
+    config (a dict) takes precedence over the environment
+        DATABASE_URI, or DATABASE_FILENAME for a SQLite file of database/
+        DATABASE_REPLICA_URIS: a list of replica URIs
+        AUTH0_DOMAIN, ALGORITHMS, API_AUDIENCE (see configure_auth)
+        SECRET_KEY: signs the read-your-writes tokens of the replicas
+    nothing connects to the database or to Auth0 before a request (or
+    warmup) needs it
+    EXAMPLE
+        app = create_app({'DATABASE_FILENAME': 'database_test.db'})
+'''
+
+
+def create_app(config=None):
+    config = dict(config or {})
+    flask_app = Flask(__name__)
+    flask_app.config.update(config)
+
+    setup_db(flask_app,
+             database_filename=config.get('DATABASE_FILENAME'),
+             database_uri=config.get('DATABASE_URI'),
+             replica_uris=config.get('DATABASE_REPLICA_URIS'))
+    auth_config = {key: config[key] for key in
+                   ('AUTH0_DOMAIN', 'ALGORITHMS', 'API_AUDIENCE')
+                   if key in config}
+    if auth_config:
+        configure_auth(auth_config.get('AUTH0_DOMAIN'),
+                       auth_config.get('ALGORITHMS'),
+                       auth_config.get('API_AUDIENCE'))
+
+    # after_request hooks run last registered first: compression sees
+    # the headers added by CORS and by the blueprint
+    install_compression(flask_app, response_cache)
+    install_read_your_writes(flask_app)
+    # Set up CORS. Allow '*' for origins.
+    CORS(flask_app, resources={r"/*": {"origins": "*"}})
+    flask_app.register_blueprint(api)
+    return flask_app
+
+
+# the application of `gunicorn agency_api:app`, `flask run` and the tests
+app = create_app()
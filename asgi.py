@@ -0,0 +1,62 @@
+import asyncio
+import os
+from a2wsgi import WSGIMiddleware
+from agency_api import app
+from auth.auth import jwks_cache
+from database.pool import (
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW
+)
+
+'''
+ASGI server mode
+    the same routes and auth on an ASGI server, e.g.
+        pip install uvicorn
+        uvicorn asgi:application --workers 2
+    the Flask app runs behind a2wsgi's WSGIMiddleware on ASGI_THREADS
+    threads per worker (by default as many as the connections of the
+    database pool, so no request waits for one), which cap the requests
+    in flight like a gthread worker. request bodies are streamed to the
+    routes. the event loop holds idle connections and refreshes the
+    JWKS keys before they expire.
+'''
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS',
+                                  DB_POOL_SIZE + DB_MAX_OVERFLOW))
+
+_tasks = []
+
+
+async def start_jwks_refresh():
+    _tasks.append(asyncio.ensure_future(jwks_cache.keep_fresh()))
+
+
+async def stop_jwks_refresh():
+    while _tasks:
+        _tasks.pop().cancel()
+
+
+wsgi_application = WSGIMiddleware(app, workers=ASGI_THREADS)
+
+
+'''
+application(scope, receive, send)
+    the ASGI application: http requests go to the Flask app, the
+    lifespan starts and stops the JWKS refresh
+'''
+
+
+async def application(scope, receive, send):
+    if scope['type'] != 'lifespan':
+        await wsgi_application(scope, receive, send)
+        return
+
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await start_jwks_refresh()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await stop_jwks_refresh()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -1,17 +1,94 @@
-import json
 from flask import (
+    g,
     request,
     _request_ctx_stack
 )
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
 import os
+import time
+from .jwks import (
+    JWKSCache,
+    async_url_fetcher,
+    url_fetcher
+)
+from .token_cache import TokenCache
+from utils.json_encoder import jsonify
+
+
+'''
+Auth configuration
+    the Auth0 domain, the accepted algorithms and the API audience are
+    read from AUTH0_DOMAIN, ALGORITHMS and API_AUDIENCE when they are
+    first needed, unless configure_auth() set them before (create_app
+    does it with the values of its config)
+'''
+
+_auth_config = {}
+
+
+def jwks_url():
+    return f'https://{get_auth_config()["domain"]}/.well-known/jwks.json'
+
+
+def fetch_jwks():
+    return url_fetcher(jwks_url())()
+
+
+async def fetch_jwks_async():
+    return await async_url_fetcher(jwks_url())()
+
+
+# process-wide cache of the Auth0 signing keys
+jwks_cache = JWKSCache(fetch_jwks, async_fetcher=fetch_jwks_async)
+
+# process-wide cache of verified token payloads
+token_cache = TokenCache()
+
+'''
+    configure_auth(domain, algorithms, audience)
+        sets the configuration, the environment fills the values
+        left out (algorithms: a list or a comma separated string)
+        returns the configuration
+'''
+
+
+def configure_auth(domain=None, algorithms=None, audience=None):
+    if isinstance(algorithms, str):
+        algorithms = algorithms.split(',')
+    previous = _auth_config.get('domain')
+    _auth_config.update({
+        'domain': domain or os.environ.get('AUTH0_DOMAIN'),
+        'algorithms': algorithms or
+        os.environ.get('ALGORITHMS', 'RS256').split(','),
+        'audience': audience or os.environ.get('API_AUDIENCE')
+    })
+    jwks_cache.algorithm = _auth_config['algorithms'][0]
+    if previous is not None and previous != _auth_config['domain']:
+        jwks_cache.clear()
+    token_cache.clear()
+    return dict(_auth_config)
 
 
-AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN')
-ALGORITHMS = os.environ.get('ALGORITHMS').split(',')
-API_AUDIENCE = os.environ.get('API_AUDIENCE')
+def get_auth_config():
+    if not _auth_config:
+        configure_auth()
+    return _auth_config
+
+
+'''
+    set_jwks_fetcher(fetcher)
+        replaces the source of the signing keys
+        (a callable returning the JWKS document as a dict)
+'''
+
+
+def set_jwks_fetcher(fetcher):
+    jwks_cache.fetcher = fetcher
+    jwks_cache.async_fetcher = None
+    jwks_cache.clear()
+    token_cache.clear()
+
 
 # AuthError Exception
 '''
@@ -106,8 +183,12 @@ def check_permissions(permission, payload):
     @INPUTS
         token: a json web token (string)
 
+    a token verified before is served from token_cache
+    an expired token is rejected before its signature is checked
+
     it should be an Auth0 token with key id (kid)
     it should verify the token using Auth0 /.well-known/jwks.json
+        (the keys are cached by jwks_cache)
     it should decode the payload from the token
     it should validate the claims
     return the decoded payload
@@ -115,10 +196,20 @@ def check_permissions(permission, payload):
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+        unverified_claims = jwt.get_unverified_claims(token)
+    except Exception:
+        raise AuthError({
+            'success': False,
+            'error': 401,
+            'message': 'invalid_header. Authorization malformed.'
+        }, 401)
+
     if 'kid' not in unverified_header:
         raise AuthError({
             'success': False,
@@ -126,24 +217,26 @@ def verify_decode_jwt(token):
             'message': 'invalid_header. Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    exp = unverified_claims.get('exp')
+    if isinstance(exp, (int, float)) and exp <= time.time():
+        raise AuthError({
+            'success': False,
+            'error': 401,
+            'message': 'token_expired. Token expired.'
+        }, 401)
+
+    config = get_auth_config()
+    rsa_key = jwks_cache.get_key(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
                 token,
                 rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
+                algorithms=config['algorithms'],
+                audience=config['audience'],
+                issuer='https://' + config['domain'] + '/'
             )
+            token_cache.put(token, payload)
 
             return payload
 
@@ -185,6 +278,7 @@ def verify_decode_jwt(token):
         and check the requested permission
     return the decorator which passes
         the decoded payload to the decorated method
+        (and keeps it in g.jwt_payload for the rest of the request)
 '''
 
 
@@ -197,7 +291,8 @@ def requires_auth(permission=''):
                 payload = verify_decode_jwt(token)
                 check_permissions(permission, payload)
             except AuthError as ae:
-                return json.dumps(ae.error), ae.status_code
+                return jsonify(ae.error), ae.status_code
+            g.jwt_payload = payload
             return f(payload, *args, **kwargs)
 
         return wrapper
@@ -0,0 +1,138 @@
+import time
+import threading
+from Crypto.PublicKey import RSA
+from jose import (
+    jwk,
+    jwt
+)
+from . import auth
+
+'''
+Local JWT issuer
+    a stand-in for the Auth0 tenant for tests and benchmarks.
+    it generates an RSA keypair, serves the public key as a JWKS document
+    and mints RS256 tokens for the roles of the casting agency.
+
+    EXAMPLE
+        issuer = get_local_issuer()
+        issuer.install()
+        headers = {
+            'Authorization': f"Bearer {issuer.role_token('PRODUCER')}"
+        }
+'''
+
+# permissions of each role (same as Roles & Permissions of README.md)
+ROLE_PERMISSIONS = {
+    'ASSISTANT': [
+        'get:actors',
+        'get:movies'
+    ],
+    'DIRECTOR': [
+        'get:actors',
+        'get:movies',
+        'post:actors',
+        'patch:actors',
+        'patch:movies',
+        'delete:actors'
+    ],
+    'PRODUCER': [
+        'get:actors',
+        'get:movies',
+        'post:actors',
+        'post:movies',
+        'patch:actors',
+        'patch:movies',
+        'delete:actors',
+        'delete:movies',
+        'get:metrics'
+    ]
+}
+
+
+class LocalIssuer():
+    '''
+    domain and audience default to the ones auth verifies tokens against
+    '''
+
+    def __init__(self, domain=None, audience=None, kid='local-issuer',
+                 bits=2048):
+        config = auth.get_auth_config()
+        self.domain = domain or config['domain']
+        self.audience = audience or config['audience']
+        self.kid = kid
+        self.fetches = 0
+
+        private_key = RSA.generate(bits)
+        self.private_pem = private_key.export_key().decode('ascii')
+        public_jwk = jwk.construct(
+            private_key.publickey().export_key(), 'RS256').to_dict()
+        public_jwk.update({'kid': kid, 'use': 'sig'})
+        self.public_jwk = public_jwk
+
+    '''
+    jwks()
+        returns the JWKS document of the issuer
+        it is a fetcher for auth.set_jwks_fetcher
+    '''
+
+    def jwks(self):
+        self.fetches += 1
+        return {'keys': [dict(self.public_jwk)]}
+
+    '''
+    install()
+        makes auth verify tokens against the keys of this issuer
+    '''
+
+    def install(self):
+        auth.set_jwks_fetcher(self.jwks)
+
+    '''
+    token(permissions, sub, expires_in, **claims)
+        returns a signed token carrying the permissions
+        claims override the standard ones (e.g. aud='other')
+    '''
+
+    def token(self, permissions, sub='local-issuer|user', expires_in=3600,
+              **claims):
+        now = int(time.time())
+        payload = {
+            'iss': f'https://{self.domain}/',
+            'sub': sub,
+            'aud': self.audience,
+            'iat': now,
+            'exp': now + expires_in,
+            'permissions': list(permissions)
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self.private_pem, algorithm='RS256',
+                          headers={'kid': self.kid})
+
+    '''
+    role_token(role)
+        returns a token with the permissions of a role
+        (ASSISTANT, DIRECTOR or PRODUCER)
+    '''
+
+    def role_token(self, role, expires_in=3600):
+        return self.token(ROLE_PERMISSIONS[role],
+                          sub=f'local-issuer|{role.lower()}',
+                          expires_in=expires_in)
+
+
+_local_issuer = None
+_local_issuer_lock = threading.Lock()
+
+'''
+get_local_issuer()
+    returns the process-wide LocalIssuer
+    (generating a keypair takes a while, so it is shared)
+'''
+
+
+def get_local_issuer():
+    global _local_issuer
+    with _local_issuer_lock:
+        if _local_issuer is None:
+            _local_issuer = LocalIssuer()
+    return _local_issuer
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from urllib.request import urlopen
+from jose import jwk
+
+'''
+JWKS key cache
+    keeps the signing keys of the identity provider in memory,
+    keyed by kid and already parsed into key objects, so verifying a
+    token does not cost a round trip to the provider.
+
+    - keys older than ttl are still served while a background thread
+      fetches the key set again (stale-while-revalidate)
+    - an unknown kid forces a refresh, at most once per
+      min_refresh_interval seconds
+    - after failure_threshold failed fetches in a row, fetching stops
+      for breaker_reset seconds (circuit breaker) and the cached keys
+      keep being served
+    - in ASGI mode, keep_fresh() refreshes the keys in the event loop
+      before they expire, so requests never wait for a fetch
+'''
+
+JWKS_CACHE_TTL = int(os.environ.get('JWKS_CACHE_TTL', 600))
+JWKS_FETCH_TIMEOUT = float(os.environ.get('JWKS_FETCH_TIMEOUT', 5))
+JWKS_MIN_REFRESH_INTERVAL = int(
+    os.environ.get('JWKS_MIN_REFRESH_INTERVAL', 30))
+JWKS_FAILURE_THRESHOLD = int(os.environ.get('JWKS_FAILURE_THRESHOLD', 3))
+JWKS_BREAKER_RESET = int(os.environ.get('JWKS_BREAKER_RESET', 60))
+# largest JWKS document accepted (a key set is a few kilobytes)
+JWKS_MAX_BYTES = int(os.environ.get('JWKS_MAX_BYTES', 1024 * 1024))
+
+
+'''
+url_fetcher(url, timeout, max_bytes)
+    returns a fetcher which downloads the JWKS document at url
+    (urllib: redirects, chunked bodies, TLS and HTTP errors), refusing
+    documents larger than max_bytes
+'''
+
+
+def url_fetcher(url, timeout=JWKS_FETCH_TIMEOUT, max_bytes=JWKS_MAX_BYTES):
+    def fetch():
+        with urlopen(url, timeout=timeout) as response:
+            body = response.read(max_bytes + 1)
+        if len(body) > max_bytes:
+            raise IOError(f'JWKS document larger than {max_bytes} bytes')
+        return json.loads(body)
+    return fetch
+
+
+'''
+async_url_fetcher(url, timeout, max_bytes)
+    returns a coroutine function which runs url_fetcher in the default
+    executor of the event loop, so the loop is not blocked
+'''
+
+
+def async_url_fetcher(url, timeout=JWKS_FETCH_TIMEOUT,
+                      max_bytes=JWKS_MAX_BYTES):
+    fetch = url_fetcher(url, timeout, max_bytes)
+
+    async def fetch_async():
+        return await asyncio.get_event_loop().run_in_executor(None, fetch)
+    return fetch_async
+
+
+class JWKSCache():
+    '''
+    fetcher: callable returning the JWKS document as a dict
+    algorithm: used for keys which do not declare their "alg"
+    async_fetcher: coroutine function returning the JWKS document,
+        used by refresh_async() (which runs fetcher in a thread without it)
+    '''
+
+    def __init__(self, fetcher, algorithm='RS256', async_fetcher=None,
+                 ttl=JWKS_CACHE_TTL,
+                 min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+                 failure_threshold=JWKS_FAILURE_THRESHOLD,
+                 breaker_reset=JWKS_BREAKER_RESET):
+        self.fetcher = fetcher
+        self.async_fetcher = async_fetcher
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.failure_threshold = failure_threshold
+        self.breaker_reset = breaker_reset
+
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._keys = {}
+        self._loaded = False
+        self._expires_at = 0
+        self._last_forced = -min_refresh_interval
+        self._refreshing = False
+        self._failures = 0
+        self._open_until = 0
+
+    '''
+    get_key(kid)
+        returns the parsed key for kid, or None if the provider
+        does not know it
+    '''
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        if not self._loaded:
+            # concurrent first requests wait for a single fetch
+            with self._fetch_lock:
+                if not self._loaded:
+                    self.refresh()
+        elif now >= self._expires_at:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and self._may_force_refresh(now):
+            self.refresh()
+            key = self._keys.get(kid)
+
+        return key
+
+    '''
+    refresh()
+        fetches the key set and replaces the cached keys
+        returns False if the fetch failed or the breaker is open
+    '''
+
+    def refresh(self):
+        if time.monotonic() < self._open_until:
+            return False
+
+        try:
+            keys = self._parse(self.fetcher())
+        except Exception:
+            print(sys.exc_info())
+            self._fetch_failed()
+            return False
+
+        self._store(keys)
+        return True
+
+    '''
+    refresh_async()
+        refresh() for the event loop
+    '''
+
+    async def refresh_async(self):
+        if time.monotonic() < self._open_until:
+            return False
+
+        try:
+            if self.async_fetcher is not None:
+                jwks = await self.async_fetcher()
+            else:
+                jwks = await asyncio.get_event_loop().run_in_executor(
+                    None, self.fetcher)
+            keys = self._parse(jwks)
+        except Exception:
+            print(sys.exc_info())
+            self._fetch_failed()
+            return False
+
+        self._store(keys)
+        return True
+
+    '''
+    keep_fresh()
+        refreshes the keys before they expire, until it is cancelled
+        (an ASGI lifespan task)
+    '''
+
+    async def keep_fresh(self):
+        while True:
+            if await self.refresh_async():
+                delay = self.ttl * 0.8
+            else:
+                delay = self.min_refresh_interval
+            await asyncio.sleep(delay)
+
+    '''
+    clear()
+        forgets the cached keys and the breaker state
+    '''
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._loaded = False
+            self._expires_at = 0
+            self._last_forced = -self.min_refresh_interval
+            self._failures = 0
+            self._open_until = 0
+
+    def _store(self, keys):
+        with self._lock:
+            self._keys = keys
+            self._loaded = True
+            self._expires_at = time.monotonic() + self.ttl
+            # the key set is fresh, an unknown kid does not need another
+            self._last_forced = time.monotonic()
+            self._failures = 0
+            self._open_until = 0
+
+    def _fetch_failed(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.breaker_reset
+
+    def _parse(self, jwks):
+        keys = {}
+        for key in jwks['keys']:
+            if 'kid' not in key:
+                continue
+            keys[key['kid']] = jwk.construct(
+                key, key.get('alg', self.algorithm))
+        return keys
+
+    def _may_force_refresh(self, now):
+        with self._lock:
+            if now - self._last_forced < self.min_refresh_interval:
+                return False
+            self._last_forced = now
+            return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._open_until:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+'''
+Verified token cache
+    maps the SHA-256 digest of a bearer token to its verified payload,
+    so a token presented again skips the signature verification and
+    claim validation. entries are dropped at the token's "exp" and the
+    least recently used entry goes when the cache is full.
+'''
+
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+class TokenCache():
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    '''
+    get(token)
+        returns the cached payload of token,
+        or None if it is unknown or expired
+    '''
+
+    def get(self, token):
+        digest = token_digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                payload, exp = entry
+                if exp > time.time():
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return dict(payload)
+                del self._entries[digest]
+            self.misses += 1
+        return None
+
+    '''
+    put(token, payload)
+        caches the verified payload of token until its "exp"
+        tokens without "exp" are not cached
+    '''
+
+    def put(self, token, payload):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)) or self.maxsize <= 0:
+            return
+
+        digest = token_digest(token)
+        with self._lock:
+            self._entries[digest] = (dict(payload), exp)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,79 @@
+'''
+    Benchmark: the auth path of requires_auth
+
+    usage (from the project root):
+        source setup.sh
+        export PYTHONPATH=$PWD
+        python bench/bench_auth.py [iterations]
+
+    tokens are minted by the local issuer, so no Auth0 tenant is needed.
+    every step is measured cold (key and token caches emptied before
+    each call) and warm (caches filled), in calls per second and p99.
+'''
+import sys
+import time
+from flask import Flask
+from auth.auth import (
+    check_permissions,
+    get_token_auth_header,
+    jwks_cache,
+    token_cache,
+    verify_decode_jwt
+)
+from auth.issuer import get_local_issuer
+
+
+def measure(call, iterations, before=None):
+    timings = []
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    total = sum(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return iterations / total, p99 * 1000
+
+
+def empty_caches():
+    jwks_cache.clear()
+    token_cache.clear()
+
+
+def main(iterations):
+    issuer = get_local_issuer()
+    issuer.install()
+    token = issuer.role_token('PRODUCER')
+    payload = verify_decode_jwt(token)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    app = Flask(__name__)
+    with app.test_request_context(headers=headers):
+        results = [
+            ('get_token_auth_header', 'cold',
+             measure(get_token_auth_header, iterations, empty_caches)),
+            ('get_token_auth_header', 'warm',
+             measure(get_token_auth_header, iterations)),
+            ('verify_decode_jwt', 'cold',
+             measure(lambda: verify_decode_jwt(token), iterations,
+                     empty_caches)),
+            ('verify_decode_jwt', 'warm',
+             measure(lambda: verify_decode_jwt(token), iterations)),
+            ('check_permissions', 'cold',
+             measure(lambda: check_permissions('get:actors', payload),
+                     iterations, empty_caches)),
+            ('check_permissions', 'warm',
+             measure(lambda: check_permissions('get:actors', payload),
+                     iterations)),
+        ]
+
+    print(f'{"step":>22} {"cache":>5} {"calls/s":>12} {"p99 ms":>9}')
+    for step, cache, (rate, p99) in results:
+        print(f'{step:>22} {cache:>5} {rate:12.0f} {p99:9.4f}')
+    print('token cache:', token_cache.stats())
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,79 @@
+'''
+    Benchmark: serializing 10k-row payloads
+
+    usage (from the project root):
+        export PYTHONPATH=$PWD
+        python bench/bench_json.py [rows]
+
+    a page of actors and a page of movies (with dates) are serialized
+    by flask.jsonify's encoder (stdlib, dates pre-formatted by the
+    models) and by utils.json_encoder with each available encoder.
+'''
+import datetime
+import json
+import sys
+import time
+from utils import json_encoder
+
+REPEAT = 20
+
+
+def payloads(rows):
+    start_date = datetime.date(1950, 1, 1)
+    actors = [{'id': i, 'name': f'actor{i}', 'age': i % 90,
+               'gender': 'MF'[i % 2]} for i in range(rows)]
+    movies = [{'id': i, 'title': f'movie{i}',
+               'release_date': start_date + datetime.timedelta(days=i)}
+              for i in range(rows)]
+    return {
+        'actors': {'success': True, 'actors': actors},
+        'movies': {'success': True, 'movies': movies}
+    }
+
+
+def flask_jsonify(payload):
+    # what flask.jsonify did: dates formatted by the model, then dumps
+    if 'movies' in payload:
+        payload = dict(payload, movies=[
+            dict(movie, release_date=movie['release_date']
+                 .strftime('%Y-%m-%d')) for movie in payload['movies']])
+    return json.dumps(payload, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def encoder_dumps(name):
+    def serialize(payload):
+        json_encoder.JSON_ENCODER = name
+        return json_encoder.dumps(payload) + b'\n'
+    return serialize
+
+
+def median_ms(serialize, payload):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        serialize(payload)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main(rows):
+    serializers = {
+        'flask.jsonify': flask_jsonify,
+        'encoder (json)': encoder_dumps('json')
+    }
+    if json_encoder.orjson is not None:
+        serializers['encoder (orjson)'] = encoder_dumps('orjson')
+
+    for name, payload in payloads(rows).items():
+        for serializer, serialize in serializers.items():
+            ms = median_ms(serialize, payload)
+            print(f'{rows} {name:>6} {serializer:>16}: {ms:8.3f} ms '
+                  f'(median of {REPEAT})')
+    return 0
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    sys.exit(main(rows))
@@ -0,0 +1,98 @@
+'''
+    Benchmark: deep pages with LIMIT/OFFSET vs keyset (cursor) seeks
+
+    usage (from the project root):
+        export PYTHONPATH=$PWD
+        python bench/bench_pagination.py [rows]
+
+    page 1 and page 10,000 are fetched repeatedly in both modes.
+    keyset pages are index range scans, so their latency should barely
+    depend on the page depth. the script reports the depth ratio of the
+    keyset pages and the speedup of keyset over offset at the deep page
+    (timings vary too much across machines for a pass / fail threshold).
+'''
+import os
+import sys
+import tempfile
+import time
+from flask import Flask
+from database.models import (
+    setup_db,
+    db_drop_and_create_all,
+    db,
+    Actor
+)
+from database.pagination import (
+    encode_cursor,
+    keyset_page,
+    offset_page
+)
+
+PER_PAGE = 10
+DEEP_PAGE = 10000
+REPEAT = 50
+
+
+def populate(rows):
+    chunk = 10000
+    for start in range(0, rows, chunk):
+        db.session.execute(Actor.__table__.insert(), [
+            {'name': f'actor{i}', 'age': i % 90, 'gender': 'MF'[i % 2]}
+            for i in range(start, min(start + chunk, rows))
+        ])
+    db.session.commit()
+
+
+def median_ms(fetch):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fetch()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main(rows):
+    app = Flask(__name__)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    setup_db(app, database_filename=path)
+    try:
+        with app.app_context():
+            db_drop_and_create_all()
+            populate(rows)
+
+            # the cursor a client holds after walking to page 9,999
+            last = Actor.query.order_by(Actor.id) \
+                .offset((DEEP_PAGE - 1) * PER_PAGE - 1).first()
+            deep_cursor = encode_cursor('id', last.id, last.id)
+
+            results = {
+                'offset page 1': median_ms(
+                    lambda: offset_page(Actor, 1, PER_PAGE)),
+                f'offset page {DEEP_PAGE}': median_ms(
+                    lambda: offset_page(Actor, DEEP_PAGE, PER_PAGE)),
+                'keyset page 1': median_ms(
+                    lambda: keyset_page(Actor, PER_PAGE)),
+                f'keyset page {DEEP_PAGE}': median_ms(
+                    lambda: keyset_page(Actor, PER_PAGE,
+                                        cursor=deep_cursor)),
+            }
+            db.session.remove()
+    finally:
+        os.remove(path)
+
+    for name, ms in results.items():
+        print(f'{name:>20}: {ms:8.3f} ms (median of {REPEAT})')
+
+    deep_keyset = results[f'keyset page {DEEP_PAGE}']
+    print(f'keyset depth ratio: '
+          f'{deep_keyset / results["keyset page 1"]:.2f}')
+    print(f'keyset speedup at page {DEEP_PAGE}: '
+          f'{results[f"offset page {DEEP_PAGE}"] / deep_keyset:.2f}')
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    main(max(rows, DEEP_PAGE * PER_PAGE))
@@ -0,0 +1,97 @@
+'''
+    Benchmark: ORM read path vs Core read path
+
+    usage (from the project root):
+        export PYTHONPATH=$PWD
+        python bench/bench_read_path.py [rows]
+
+    a page of 100 movies and the whole movie table are read and
+    formatted with ORM models + format() and with Core selects +
+    row_formatter(). the script exits with 1 if the two paths do not
+    produce the same JSON.
+'''
+import datetime
+import os
+import sys
+import tempfile
+import time
+from flask import Flask
+from database.models import (
+    setup_db,
+    db_drop_and_create_all,
+    db,
+    Movie
+)
+from utils.json_encoder import dumps
+
+PER_PAGE = 100
+REPEAT = 20
+
+
+def populate(rows):
+    chunk = 10000
+    start_date = datetime.date(1950, 1, 1)
+    for start in range(0, rows, chunk):
+        db.session.execute(Movie.__table__.insert(), [
+            {'title': f'movie{i}',
+             'release_date': start_date + datetime.timedelta(days=i % 20000)}
+            for i in range(start, min(start + chunk, rows))
+        ])
+    db.session.commit()
+
+
+def orm_read(limit):
+    movies = Movie.query.order_by(Movie.id).limit(limit).all()
+    return [movie.format() for movie in movies]
+
+
+def core_read(limit):
+    rows = db.session.execute(
+        Movie.select_fields(Movie.FIELDS).order_by(Movie.id).limit(limit))
+    format_row = Movie.row_formatter(Movie.FIELDS)
+    return [format_row(row) for row in rows]
+
+
+def median_ms(read, limit):
+    timings = []
+    for _ in range(REPEAT):
+        db.session.expunge_all()  # no identity map hits between runs
+        start = time.perf_counter()
+        read(limit)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main(rows):
+    app = Flask(__name__)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    setup_db(app, database_filename=path)
+    try:
+        with app.app_context():
+            db_drop_and_create_all()
+            populate(rows)
+
+            same = dumps(orm_read(rows)) == dumps(core_read(rows))
+            results = {}
+            for name, limit in ((f'page of {PER_PAGE}', PER_PAGE),
+                                (f'table of {rows}', rows)):
+                orm_ms = median_ms(orm_read, limit)
+                core_ms = median_ms(core_read, limit)
+                results[name] = (orm_ms, core_ms)
+            db.session.remove()
+    finally:
+        os.remove(path)
+
+    for name, (orm_ms, core_ms) in results.items():
+        print(f'{name:>16}: orm {orm_ms:9.3f} ms, core {core_ms:9.3f} ms '
+              f'({orm_ms / core_ms:.1f}x, median of {REPEAT})')
+
+    print('same json:', same)
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    sys.exit(main(max(rows, PER_PAGE)))
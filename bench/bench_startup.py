@@ -0,0 +1,105 @@
+'''
+    Benchmark: startup time of a worker
+
+    usage (from the project root):
+        export PYTHONPATH=$PWD
+        python bench/bench_startup.py [runs]
+
+    every run starts a fresh interpreter which imports agency_api, then
+    serves a first GET /actors (a temporary SQLite database, a token of
+    the local issuer) with the test client. the median of the runs is
+    compared with the budgets, in milliseconds:
+        STARTUP_IMPORT_BUDGET_MS (2000)
+        STARTUP_FIRST_REQUEST_BUDGET_MS (1000)
+    the script exits with 1 if one of them is exceeded.
+'''
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORT_BUDGET_MS = float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 2000))
+FIRST_REQUEST_BUDGET_MS = float(
+    os.environ.get('STARTUP_FIRST_REQUEST_BUDGET_MS', 1000))
+
+
+def child():
+    # runs in the fresh interpreter: prints the timings as JSON
+    start = time.perf_counter()
+    import agency_api
+    import_ms = (time.perf_counter() - start) * 1000
+
+    from auth.issuer import get_local_issuer
+    issuer = get_local_issuer()  # generating the keypair is not timed
+    issuer.install()
+    headers = {'Authorization': f"Bearer {issuer.role_token('ASSISTANT')}"}
+
+    start = time.perf_counter()
+    res = agency_api.app.test_client().get('/actors', headers=headers)
+    first_request_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({'import_ms': import_ms,
+                      'first_request_ms': first_request_ms,
+                      'status': res.status_code}))
+
+
+def create_database(path):
+    from agency_api import create_app
+    from database.models import (
+        db,
+        db_drop_and_create_all,
+        Actor
+    )
+    app = create_app({'DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        db_drop_and_create_all()
+        Actor(name='first_actor', age=30, gender='M').insert()
+        db.session.remove()
+
+
+def measure(runs):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    env = dict(os.environ, DATABASE_URI=f'sqlite:///{path}',
+               AUTH0_DOMAIN=os.environ.get('AUTH0_DOMAIN', 'local.test'),
+               API_AUDIENCE=os.environ.get('API_AUDIENCE', 'agency'))
+    try:
+        subprocess.run([sys.executable, __file__, '--create', path],
+                       env=env, check=True)
+        results = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, __file__, '--child'], env=env, check=True,
+                stdout=subprocess.PIPE).stdout
+            results.append(json.loads(output.decode('utf-8').splitlines()[-1]))
+    finally:
+        os.remove(path)
+
+    if any(result['status'] != 200 for result in results):
+        raise RuntimeError(f'first request failed: {results}')
+    return {
+        name: sorted(result[name] for result in results)[len(results) // 2]
+        for name in ('import_ms', 'first_request_ms')
+    }
+
+
+def main(runs):
+    medians = measure(runs)
+    over = False
+    for name, budget in (('import_ms', IMPORT_BUDGET_MS),
+                         ('first_request_ms', FIRST_REQUEST_BUDGET_MS)):
+        exceeded = medians[name] > budget
+        over = over or exceeded
+        print(f'{name:>16}: {medians[name]:9.3f} ms (budget {budget:.0f} ms'
+              f'{", EXCEEDED" if exceeded else ""}, median of {runs})')
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child()
+    elif sys.argv[1:2] == ['--create']:
+        create_database(sys.argv[2])
+    else:
+        sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
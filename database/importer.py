@@ -0,0 +1,159 @@
+import csv
+import json
+import os
+import sys
+from .models import db
+
+'''
+Streaming import
+    reads NDJSON or CSV rows from a text stream, validates them one by one
+    and writes the valid ones in chunks, one commit per chunk
+    (COPY FROM STDIN on Postgres, executemany elsewhere).
+    the input is never loaded as a whole.
+
+    an import which stops half way can be resumed with resume_from,
+    the number of input rows consumed by the last committed chunk
+    (reported as "committed").
+'''
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+IMPORT_FORMATS = ('ndjson', 'csv')
+# rejected rows listed in the report (all of them are counted)
+MAX_REPORTED_ERRORS = 100
+
+
+'''
+parse_rows(stream, format)
+    yields the rows of the stream as dicts, or the exception
+    raised while parsing a row
+'''
+
+
+def parse_rows(stream, format):
+    if format not in IMPORT_FORMATS:
+        raise ValueError('format must be one of {}'.format(
+            ', '.join(IMPORT_FORMATS)))
+
+    if format == 'csv':
+        for row in csv.DictReader(stream):
+            yield row
+        return
+
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('row must be an object')
+        except ValueError as e:
+            row = e
+        yield row
+
+
+class ImportFailed(Exception):
+    '''
+    raised when writing a chunk fails
+    report: the report of the rows committed before the failure
+    status: the HTTP status of the failure
+    '''
+    status = 500
+
+    def __init__(self, report, message='import stopped, resume from '
+                                       'committed', status=None):
+        super().__init__(message)
+        self.report = report
+        self.message = message
+        if status is not None:
+            self.status = status
+
+
+class UnreadableInput(ImportFailed):
+    '''
+    raised when the stream cannot be decoded, parsed or read any further
+    (e.g. invalid UTF-8, a broken CSV quote or a body over the size
+    limit, whose HTTP status it takes), after the valid rows read before
+    were committed
+    '''
+    status = 400
+
+
+'''
+import_rows(model, stream, format, validate,
+            chunk_size, resume_from, on_commit)
+    imports the rows of the stream into the model's table
+    validate: returns the column values of a row (checking the types of
+        the values, so a chunk only holds writable rows) or raises
+    on_commit: called with the "committed" offset after each chunk
+    returns the report
+        imported: rows written
+        rejected: rows which failed to parse or validate
+        errors: the first rejected rows by input row (0-based)
+        committed: input rows consumed by the committed chunks
+'''
+
+
+def import_rows(model, stream, format, validate,
+                chunk_size=IMPORT_CHUNK_SIZE, resume_from=0,
+                on_commit=None):
+    report = {
+        'imported': 0,
+        'rejected': 0,
+        'errors': [],
+        'committed': resume_from
+    }
+    chunk = []
+
+    def write(consumed):
+        try:
+            if chunk:
+                model.copy_insert(chunk)
+        except Exception:
+            print(sys.exc_info())
+            db.session.rollback()
+            raise ImportFailed(report)
+        report['imported'] += len(chunk)
+        report['committed'] = consumed
+        chunk.clear()
+        if on_commit is not None:
+            on_commit(consumed)
+
+    consumed = 0
+    rows = enumerate(parse_rows(stream, format))
+    while True:
+        try:
+            index, row = next(rows)
+        except StopIteration:
+            break
+        except Exception as e:
+            # reading failed: keep the rows read so far
+            print(sys.exc_info())
+            if consumed > report['committed']:
+                write(consumed)
+            message = getattr(e, 'description', None) or str(e)
+            raise UnreadableInput(report, f'unreadable {format} after row '
+                                          f'{consumed}: {message}',
+                                  getattr(e, 'code', None))
+        consumed = index + 1
+        if index < resume_from:
+            continue
+
+        try:
+            if isinstance(row, Exception):
+                raise row
+            chunk.append(validate(row))
+        except Exception as e:
+            report['rejected'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({
+                    'row': index,
+                    'message': getattr(e, 'description', None) or str(e)
+                })
+
+        if len(chunk) >= chunk_size:
+            write(consumed)
+
+    if consumed > report['committed']:
+        write(consumed)
+
+    return report
@@ -1,16 +1,121 @@
+import os
+import sys
 from flask_script import Manager
 from flask_migrate import (
         Migrate,
         MigrateCommand
 )
-from agency_api import app
-from models import db
+from agency_api import (
+        app,
+        validate_actor,
+        validate_movie
+)
+from database.models import (
+        db,
+        Actor,
+        Movie
+)
+from database import stats
+from database.importer import (
+        IMPORT_CHUNK_SIZE,
+        IMPORT_FORMATS,
+        ImportFailed,
+        import_rows
+)
 
 migrate = Migrate(app, db)
 manager = Manager(app)
 
 manager.add_command('db', MigrateCommand)
 
+IMPORT_MODELS = {
+        'actors': (Actor, validate_actor),
+        'movies': (Movie, validate_movie)
+}
+
+'''
+import_data
+    imports actors or movies from an NDJSON or CSV file
+    with --checkpoint, the committed offset is written to the file after
+    every chunk and a later run resumes from it
+    EXAMPLE
+        python database/manage.py import_data -m actors -f actors.csv \\
+            --format csv --checkpoint actors.offset
+'''
+
+
+@manager.option('-m', '--model', dest='model', required=True,
+                choices=list(IMPORT_MODELS))
+@manager.option('-f', '--file', dest='path', required=True)
+@manager.option('--format', dest='format', default='ndjson',
+                choices=IMPORT_FORMATS)
+@manager.option('--chunk-size', dest='chunk_size', type=int,
+                default=IMPORT_CHUNK_SIZE)
+@manager.option('--resume-from', dest='resume_from', type=int, default=None)
+@manager.option('--checkpoint', dest='checkpoint', default=None)
+def import_data(model, path, format, chunk_size, resume_from, checkpoint):
+        if resume_from is None:
+                resume_from = 0
+                if checkpoint and os.path.exists(checkpoint):
+                        with open(checkpoint) as f:
+                                resume_from = int(f.read().strip() or 0)
+
+        def save_checkpoint(committed):
+                with open(checkpoint, 'w') as f:
+                        f.write(str(committed))
+
+        model, validate = IMPORT_MODELS[model]
+        with open(path, newline='', encoding='utf-8') as stream:
+                try:
+                        report = import_rows(
+                                model, stream, format, validate,
+                                chunk_size=chunk_size,
+                                resume_from=resume_from,
+                                on_commit=save_checkpoint
+                                if checkpoint else None)
+                except ImportFailed as e:
+                        report = e.report
+                        print(e.message, '- resume from row',
+                              report['committed'])
+
+        print('imported: {imported}, rejected: {rejected}, '
+              'committed rows: {committed}'.format(**report))
+        for error in report['errors']:
+                print('row {row}: {message}'.format(**error))
+
+
+'''
+rebuild_stats
+    recomputes the summary statistics of GET /stats from the tables
+    EXAMPLE
+        python database/manage.py rebuild_stats
+'''
+
+
+@manager.command
+def rebuild_stats():
+        print('summary rows written:', stats.rebuild())
+
+
+'''
+check_stats
+    compares the summary statistics with a GROUP BY recomputation
+    exits with 1 if they differ
+    EXAMPLE
+        python database/manage.py check_stats
+'''
+
+
+@manager.command
+def check_stats():
+        differences = stats.check()
+        for difference in differences:
+                print('{table} {name} {bucket}: stored {stored}, '
+                      'expected {expected}'.format(**difference))
+        if differences:
+                sys.exit(1)
+        print('summary statistics are consistent')
+
 
 if __name__ == '__main__':
         manager.run()
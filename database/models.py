@@ -3,32 +3,82 @@ from sqlalchemy import (
     Column,
     String,
     Integer,
-    Date
+    Date,
+    ForeignKey,
+    Index,
+    select,
+    text
 )
-from flask_sqlalchemy import SQLAlchemy
-import json
+from utils.json_encoder import dumps
+from .pool import engine_options
+from .replicas import (
+    RoutingSQLAlchemy,
+    replica_uris_from_environ,
+    setup_replicas
+)
+import csv
+import datetime
+import io
+import threading
+import time
+from collections import Counter
 
 project_dir = os.path.dirname(os.path.abspath(__file__))
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+
+# older SQLite builds allow 999 bound parameters per statement
+SQLITE_MAX_VARIABLES = 999
+
+# seconds a cached row count stays valid (writes around the helpers do not
+# bump the table version)
+COUNT_CACHE_TTL = int(os.environ.get('COUNT_CACHE_TTL', 30))
+# cached counts (one per table and filter) before the cache starts over
+COUNT_CACHE_SIZE = 1024
+_count_cache = {}
+_count_cache_lock = threading.Lock()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    the pool and connection options come from the environment
+    (see database/pool.py)
+    database_uri: the database, DATABASE_URI by default
+    replica_uris: read replicas of the database (see database/replicas.py)
 '''
 
 
-def setup_db(app, database_filename=None):
+def setup_db(app, database_filename=None, replica_uris=None,
+             database_uri=None):
     if database_filename is not None:
         # if database_filename exists, use sqllite
         database_path = "sqlite:///{}".format(
             os.path.join(project_dir, database_filename))
     else:
         # else use postgres
-        database_path = os.environ.get('DATABASE_URI')
+        database_path = database_uri or os.environ.get('DATABASE_URI')
+        if replica_uris is None:
+            replica_uris = replica_uris_from_environ()
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
+    setup_replicas(app, replica_uris)
+
+
+'''
+dispose_engines(app)
+    drops the connections of the primary and replica engines, e.g. the
+    ones a forked worker inherited from its parent
+'''
+
+
+def dispose_engines(app):
+    with app.app_context():
+        db.engine.dispose()
+    router = app.extensions.get('db_replicas')
+    if router is not None:
+        router.dispose()
 
 
 '''
@@ -45,6 +95,202 @@ def db_drop_and_create_all():
     db.create_all()
 
 
+_write_listeners = []
+
+'''
+register_write_listener(listener)
+    listener(table_name) is called after every write
+    of the Helper methods is committed
+'''
+
+
+def register_write_listener(listener):
+    _write_listeners.append(listener)
+
+
+'''
+cached_count(model, criteria=(), key=None)
+    returns the number of rows of the model's table
+    (matching the filter criteria, cached under key)
+    the value is cached under the table version for COUNT_CACHE_TTL
+    seconds, so a write of any process (which bumps the version) makes
+    every process count again
+'''
+
+
+def cached_count(model, criteria=(), key=None):
+    name = model.__tablename__
+    cache_key = (name, key, table_versions(name)[name])
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(cache_key)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    query = model.query.order_by(None)
+    if criteria:
+        query = query.filter(*criteria)
+    count = query.count()
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_SIZE:
+            _count_cache.clear()
+        _count_cache[cache_key] = (count, now + COUNT_CACHE_TTL)
+    return count
+
+
+'''
+invalidate_count(model)
+    drops the cached row counts of the model's table
+'''
+
+
+def invalidate_count(model):
+    with _count_cache_lock:
+        for cache_key in [cache_key for cache_key in _count_cache
+                          if cache_key[0] == model.__tablename__]:
+            del _count_cache[cache_key]
+
+
+'''
+chunked(values, reserved)
+    splits values into lists which fit into the bound parameters
+    of one statement (reserved: parameters used by the rest of it)
+'''
+
+
+def chunked(values, reserved=0):
+    values = list(values)
+    if db.engine.dialect.name != 'sqlite':
+        return [values] if values else []
+    size = max(1, SQLITE_MAX_VARIABLES - reserved)
+    return [values[start:start + size]
+            for start in range(0, len(values), size)]
+
+
+'''
+copy_value(value)
+    a column value as text for COPY ... WITH CSV
+'''
+
+
+def copy_value(value):
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+'''
+increment(table, column, rows)
+    adds to column of the rows of table, inserting the rows which do
+    not exist, with INSERT ... ON CONFLICT DO UPDATE (Postgres, SQLite
+    3.24+) so concurrent first writes of a row do not collide
+    rows are dicts of the primary key values and the amount to add
+'''
+
+
+def increment(table, column, rows):
+    if not rows:
+        return
+    preparer = db.engine.dialect.identifier_preparer
+    keys = [key.name for key in table.primary_key.columns]
+    name = preparer.format_table(table)
+    db.session.execute(text(
+        'INSERT INTO {table} ({columns}) VALUES ({values}) '
+        'ON CONFLICT ({keys}) DO UPDATE '
+        'SET {column} = {table}.{column} + excluded.{column}'.format(
+            table=name,
+            columns=', '.join(preparer.quote(key)
+                              for key in keys + [column]),
+            values=', '.join(f':{key}' for key in keys + [column]),
+            keys=', '.join(preparer.quote(key) for key in keys),
+            column=preparer.quote(column))), rows)
+
+
+'''
+TableVersion
+    a version counter of each table, bumped by every write
+    of the Helper methods in the writing transaction
+    (used to derive ETags without querying the table itself)
+'''
+
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_version'
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+'''
+bump_version(name)
+    increments the version of a table in the current transaction
+'''
+
+
+def bump_version(name):
+    increment(TableVersion.__table__, 'version',
+              [{'name': name, 'version': 1}])
+
+
+'''
+table_versions(*names)
+    returns the versions of the tables (0 if never written)
+    with a single query
+'''
+
+
+def table_versions(*names):
+    table = TableVersion.__table__
+    versions = dict.fromkeys(names, 0)
+    versions.update(db.session.execute(
+        select([table.c.name, table.c.version])
+        .where(table.c.name.in_(names))).fetchall())
+    return versions
+
+
+'''
+Stat
+    summary counts of a table (e.g. actors by gender), kept up to date
+    by the writes of the Helper methods in the writing transaction
+    table: the model's table
+    name: the statistic (a key of the model's STATS)
+    bucket: the value counted
+'''
+
+
+class Stat(db.Model):
+    __tablename__ = 'stat'
+    table = Column(String(50), primary_key=True)
+    name = Column(String(50), primary_key=True)
+    bucket = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+'''
+update_stats(table_name, deltas)
+    adds the deltas ({(name, bucket): delta}) to the summary counts
+    of a table in the current transaction
+'''
+
+
+def update_stats(table_name, deltas):
+    increment(Stat.__table__, 'count', [
+        {'table': table_name, 'name': name, 'bucket': bucket, 'count': delta}
+        for (name, bucket), delta in sorted(deltas.items()) if delta != 0])
+
+
+'''
+age_bucket(age)
+    the bucket of the age histogram, e.g. '30-39'
+'''
+
+
+def age_bucket(age):
+    low = age // 10 * 10
+    return f'{low}-{low + 9}'
+
+
 '''
 Helper
 implement common helper methods for model
@@ -61,6 +307,41 @@ class Helper():
     def format(self):
         return {}
 
+    '''
+    select_fields(fields, *extra)
+        a Core select of the columns of the given fields, in this order,
+        followed by the extra ones (e.g. the id and sort key needed to
+        page). rows are plain tuples: no model is built
+        EXAMPLE
+            db.session.execute(
+                Actor.select_fields(('name',), 'id').where(...))
+    '''
+
+    @classmethod
+    def select_fields(cls, fields, *extra):
+        columns = cls.__table__.c
+        names = dict.fromkeys(tuple(fields) + extra)
+        return select([columns[name] for name in names])
+
+    '''
+    row_formatter(fields)
+        returns a function building the json representation of a row
+        of select_fields(fields, ...) (the json encoder converts
+        the values which are not json types)
+        EXAMPLE
+            format_row = Movie.row_formatter(Movie.FIELDS)
+            movies = [format_row(row) for row in rows]
+    '''
+
+    @classmethod
+    def row_formatter(cls, fields):
+        fields = tuple(fields)
+
+        def format_row(row):
+            return dict(zip(fields, row))
+
+        return format_row
+
     '''
     insert()
         inserts a new model into a database
@@ -72,8 +353,12 @@ class Helper():
     '''
 
     def insert(self):
+        cls = type(self)
         db.session.add(self)
-        db.session.commit()
+        if cls.STATS:
+            update_stats(cls.__tablename__,
+                         cls.stat_deltas([self.stat_values()], 1))
+        cls.commit_write()
 
     '''
     delete()
@@ -85,8 +370,13 @@ class Helper():
     '''
 
     def delete(self):
+        cls = type(self)
+        if cls.STATS:
+            update_stats(cls.__tablename__,
+                         cls.stat_deltas([self.stat_values()], -1))
+        references = cls.delete_references([self.id])
         db.session.delete(self)
-        db.session.commit()
+        cls.commit_write(also=references)
 
     '''
     update()
@@ -99,10 +389,229 @@ class Helper():
     '''
 
     def update(self):
+        cls = type(self)
+        if cls.STATS:
+            # the stored values, the changes are not flushed yet
+            old = cls.stat_rows([self.id]).values()
+            deltas = cls.stat_deltas(old, -1)
+            update_stats(cls.__tablename__,
+                         cls.stat_deltas([self.stat_values()], 1, deltas))
+        cls.commit_write(count_changed=False)
+
+    '''
+    commit_write(count_changed=True, also=())
+        commits a write to the model's table
+        (and to the tables of the also models)
+        the table versions are bumped in the same transaction
+        every write of the helper methods ends here
+    '''
+
+    @classmethod
+    def commit_write(cls, count_changed=True, also=()):
+        models = (cls,) + tuple(also)
+        for model in models:
+            bump_version(model.__tablename__)
         db.session.commit()
+        for model in models:
+            if count_changed:
+                invalidate_count(model)
+            for listener in _write_listeners:
+                listener(model.__tablename__)
+
+    # summary statistics of the table: name -> function returning the
+    # bucket of a row (a mapping of the STAT_COLUMNS values)
+    STATS = {}
+    STAT_COLUMNS = ()
+
+    '''
+    stat_deltas(rows, sign, deltas=None)
+        counts the buckets of rows into deltas
+        (sign: 1 for added rows, -1 for removed ones)
+        returns deltas ({(name, bucket): delta})
+    '''
+
+    @classmethod
+    def stat_deltas(cls, rows, sign, deltas=None):
+        deltas = Counter() if deltas is None else deltas
+        for row in rows:
+            for name, bucket in cls.STATS.items():
+                deltas[(name, bucket(row))] += sign
+        return deltas
+
+    '''
+    stat_rows(ids)
+        returns {id: row} of the STAT_COLUMNS values of the rows as
+        they are in the database (read before a write changes them)
+    '''
+
+    @classmethod
+    def stat_rows(cls, ids):
+        table = cls.__table__
+        columns = [table.c.id] + [table.c[name] for name in cls.STAT_COLUMNS]
+        rows = {}
+        for chunk in chunked(sorted(ids)):
+            rows.update((row.id, row) for row in db.session.execute(
+                select(columns).where(table.c.id.in_(chunk))))
+        return rows
+
+    '''
+    stat_values()
+        returns the STAT_COLUMNS values of the model
+        (a mapping like the rows of stat_rows)
+    '''
+
+    def stat_values(self):
+        return {name: getattr(self, name) for name in self.STAT_COLUMNS}
+
+    # (association model, column) of the rows referencing the id of
+    # this model, deleted with it (foreign keys are not enforced
+    # by SQLite)
+    REFERENCES = ()
+
+    '''
+    delete_references(ids)
+        deletes the rows of REFERENCES which reference the ids
+        returns the association models written
+    '''
+
+    @classmethod
+    def delete_references(cls, ids):
+        for model, column_name in cls.REFERENCES:
+            column = model.__table__.c[column_name]
+            for chunk in chunked(sorted(ids)):
+                db.session.execute(
+                    model.__table__.delete().where(column.in_(chunk)))
+        return tuple(model for model, column_name in cls.REFERENCES)
+
+    '''
+    bulk_insert(rows)
+        inserts many new models with multi-row INSERT statements
+        and a single commit
+        rows are dicts of column values
+        EXAMPLE
+            Movie.bulk_insert([
+                {'title': 'Titanic', 'release_date': release_date},
+                {'title': 'Avatar', 'release_date': release_date}
+            ])
+    '''
+
+    @classmethod
+    def bulk_insert(cls, rows):
+        table = cls.__table__
+        chunk = len(rows)
+        if db.engine.dialect.name == 'sqlite':
+            chunk = max(1, SQLITE_MAX_VARIABLES // len(table.columns))
+        for start in range(0, len(rows), chunk):
+            db.session.execute(table.insert().values(
+                rows[start:start + chunk]))
+        if cls.STATS:
+            update_stats(cls.__tablename__, cls.stat_deltas(rows, 1))
+        cls.commit_write()
+
+    '''
+    copy_insert(rows)
+        inserts many new models with a single commit, the fastest way
+        the database offers: COPY FROM STDIN on Postgres (psycopg2),
+        executemany elsewhere
+        rows are dicts of column values with the same keys
+    '''
+
+    @classmethod
+    def copy_insert(cls, rows):
+        table = cls.__table__
+        if db.engine.dialect.name == 'postgresql':
+            columns = list(rows[0])
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([copy_value(row[column])
+                                 for column in columns])
+            buffer.seek(0)
+
+            # the DBAPI connection of the session's transaction
+            cursor = db.session.connection().connection.cursor()
+            cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH CSV'.format(
+                table.name, ', '.join(f'"{column}"' for column in columns)),
+                buffer)
+        else:
+            db.session.execute(table.insert(), rows)
+        if cls.STATS:
+            update_stats(cls.__tablename__, cls.stat_deltas(rows, 1))
+        cls.commit_write()
+
+    '''
+    existing_ids(ids)
+        returns the set of ids which exist in the database
+    '''
+
+    @classmethod
+    def existing_ids(cls, ids):
+        table = cls.__table__
+        found = set()
+        for chunk in chunked(set(ids)):
+            found.update(row[0] for row in db.session.execute(
+                select([table.c.id]).where(table.c.id.in_(chunk))))
+        return found
+
+    '''
+    bulk_update(changes_by_id)
+        updates many models with set-based UPDATE statements
+        (one per distinct set of changes) and a single commit
+        returns the ids which do not exist
+        EXAMPLE
+            Actor.bulk_update({1: {'age': 40}, 2: {'age': 40}})
+    '''
+
+    @classmethod
+    def bulk_update(cls, changes_by_id):
+        table = cls.__table__
+        found = cls.existing_ids(changes_by_id)
+
+        changed = [id for id in found
+                   if set(changes_by_id[id]) & set(cls.STAT_COLUMNS)]
+        if cls.STATS and changed:
+            old = cls.stat_rows(changed)
+            deltas = cls.stat_deltas(old.values(), -1)
+            cls.stat_deltas([dict(old[id], **changes_by_id[id])
+                             for id in changed], 1, deltas)
+            update_stats(cls.__tablename__, deltas)
+
+        groups = {}
+        for id in found:
+            changes = changes_by_id[id]
+            groups.setdefault(tuple(sorted(changes.items())), []).append(id)
+        for changes, ids in groups.items():
+            for chunk in chunked(sorted(ids), reserved=len(changes)):
+                db.session.execute(table.update()
+                                   .where(table.c.id.in_(chunk))
+                                   .values(dict(changes)))
+        cls.commit_write(count_changed=False)
+
+        return sorted(set(changes_by_id) - found)
+
+    '''
+    bulk_delete(ids)
+        deletes many models with set-based DELETE statements
+        and a single commit
+        returns the ids which do not exist
+    '''
+
+    @classmethod
+    def bulk_delete(cls, ids):
+        table = cls.__table__
+        found = cls.existing_ids(ids)
+        if cls.STATS and found:
+            update_stats(cls.__tablename__,
+                         cls.stat_deltas(cls.stat_rows(found).values(), -1))
+        references = cls.delete_references(found)
+        for chunk in chunked(sorted(found)):
+            db.session.execute(table.delete().where(table.c.id.in_(chunk)))
+        cls.commit_write(also=references)
+
+        return sorted(set(ids) - found)
 
     def __repr__(self):
-        return json.dumps(self.format())
+        return dumps(self.format()).decode('utf-8')
 
 
 '''
@@ -113,6 +622,21 @@ a persistent movie entity, extends the base SQLAlchemy Model
 
 class Movie(db.Model, Helper):
     __tablename__ = 'Movie'
+    # fields of the json representation
+    FIELDS = ('id', 'title', 'release_date')
+    # fields which list endpoints can be sorted by
+    SORT_COLUMNS = ('id', 'title', 'release_date')
+    # summary statistics (GET /stats)
+    STATS = {
+        'total': lambda row: 'all',
+        'by_release_year': lambda row: str(row['release_date'].year)
+    }
+    STAT_COLUMNS = ('release_date',)
+    # (sort key, id) indexes for filters and keyset pages
+    __table_args__ = (
+        Index('ix_movie_release_date_id', 'release_date', 'id'),
+        Index('ix_movie_title_id', 'title', 'id'),
+    )
     # Autoincrementing, unique primary key
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
@@ -129,7 +653,7 @@ class Movie(db.Model, Helper):
         return {
             'id': self.id,
             'title': self.title,
-            'release_date': self.release_date.strftime('%Y-%m-%d')
+            'release_date': self.release_date
         }
 
 
@@ -141,6 +665,23 @@ a persistent actor entity, extends the base SQLAlchemy Model
 
 class Actor(db.Model, Helper):
     __tablename__ = 'Actor'
+    # fields of the json representation
+    FIELDS = ('id', 'name', 'age', 'gender')
+    # fields which list endpoints can be sorted by
+    SORT_COLUMNS = ('id', 'name', 'age')
+    # summary statistics (GET /stats)
+    STATS = {
+        'total': lambda row: 'all',
+        'by_gender': lambda row: row['gender'],
+        'by_age': lambda row: age_bucket(row['age'])
+    }
+    STAT_COLUMNS = ('gender', 'age')
+    # (sort key, id) indexes for filters and keyset pages
+    __table_args__ = (
+        Index('ix_actor_gender_age_id', 'gender', 'age', 'id'),
+        Index('ix_actor_age_id', 'age', 'id'),
+        Index('ix_actor_name_id', 'name', 'id'),
+    )
     # Autoincrementing, unique primary key
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
@@ -162,3 +703,126 @@ class Actor(db.Model, Helper):
             'age': self.age,
             'gender': self.gender
         }
+
+
+'''
+Cast
+an actor cast in a movie, the association of Actor and Movie
+'''
+
+
+class Cast(db.Model, Helper):
+    __tablename__ = 'Cast'
+    # fields of the json representation
+    FIELDS = ('movie_id', 'actor_id')
+    # the primary key serves the cast of a movie,
+    # the index the movies of an actor
+    __table_args__ = (
+        Index('ix_cast_actor_id_movie_id', 'actor_id', 'movie_id'),
+    )
+    movie_id = Column(Integer, ForeignKey('Movie.id', ondelete='CASCADE'),
+                      primary_key=True)
+    actor_id = Column(Integer, ForeignKey('Actor.id', ondelete='CASCADE'),
+                      primary_key=True)
+
+    '''
+    format()
+        json representation of the Cast model
+    '''
+
+    def format(self):
+        return {
+            'movie_id': self.movie_id,
+            'actor_id': self.actor_id
+        }
+
+    '''
+    existing_pairs(pairs)
+        returns the set of (movie_id, actor_id) pairs which exist
+    '''
+
+    @classmethod
+    def existing_pairs(cls, pairs):
+        table = cls.__table__
+        pairs = set(pairs)
+        found = set()
+        for chunk in chunked(sorted(set(movie_id for movie_id, _ in pairs))):
+            found.update(
+                (row.movie_id, row.actor_id) for row in db.session.execute(
+                    select([table.c.movie_id, table.c.actor_id])
+                    .where(table.c.movie_id.in_(chunk))))
+        return found & pairs
+
+    '''
+    bulk_cast(pairs)
+        casts actors in movies with multi-row INSERT statements and a
+        single commit. pairs already cast are skipped
+        returns the number of pairs added
+        EXAMPLE
+            Cast.bulk_cast([(movie_id, actor_id), (movie_id, actor_id2)])
+    '''
+
+    @classmethod
+    def bulk_cast(cls, pairs):
+        new_pairs = sorted(set(pairs) - cls.existing_pairs(pairs))
+        if new_pairs:
+            cls.bulk_insert([{'movie_id': movie_id, 'actor_id': actor_id}
+                             for movie_id, actor_id in new_pairs])
+        return len(new_pairs)
+
+    '''
+    bulk_uncast(pairs)
+        removes actors from movies with one DELETE statement per movie
+        and a single commit
+        returns the number of pairs removed
+    '''
+
+    @classmethod
+    def bulk_uncast(cls, pairs):
+        table = cls.__table__
+        found = cls.existing_pairs(pairs)
+        actors_by_movie = {}
+        for movie_id, actor_id in found:
+            actors_by_movie.setdefault(movie_id, []).append(actor_id)
+        for movie_id, actor_ids in actors_by_movie.items():
+            for chunk in chunked(sorted(actor_ids), reserved=1):
+                db.session.execute(table.delete()
+                                   .where(table.c.movie_id == movie_id)
+                                   .where(table.c.actor_id.in_(chunk)))
+        if found:
+            cls.commit_write()
+        return len(found)
+
+    '''
+    related(model, ids, fields)
+        the rows of model (Actor or Movie) cast with each of the ids of
+        the other model, read by one join per chunk of ids
+        returns {id: [formatted rows of model]}
+        EXAMPLE
+            actors_by_movie = Cast.related(Actor, movie_ids, Actor.FIELDS)
+    '''
+
+    @classmethod
+    def related(cls, model, ids, fields):
+        table = cls.__table__
+        if model is Actor:
+            own, other = table.c.movie_id, table.c.actor_id
+        else:
+            own, other = table.c.actor_id, table.c.movie_id
+        format_row = model.row_formatter(fields)
+
+        related = {id: [] for id in ids}
+        for chunk in chunked(sorted(related)):
+            query = model.select_fields(fields) \
+                .column(own) \
+                .select_from(table.join(model.__table__, other == model.id)) \
+                .where(own.in_(chunk)) \
+                .order_by(own, model.id)
+            for row in db.session.execute(query):
+                related[row[-1]].append(format_row(row))
+        return related
+
+
+# cast rows are deleted with their movie or actor
+Movie.REFERENCES = ((Cast, 'movie_id'),)
+Actor.REFERENCES = ((Cast, 'actor_id'),)
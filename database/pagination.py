@@ -0,0 +1,167 @@
+import base64
+import datetime
+import json
+from sqlalchemy import (
+    and_,
+    or_,
+    tuple_,
+    select,
+    Date
+)
+from .models import db
+
+'''
+Keyset (cursor) pagination
+    a page is fetched by seeking past the (sort_key, id) of the last row
+    of the previous page, so every page is an index range scan whatever
+    its depth. the position is handed to clients as an opaque cursor.
+
+    pages are read with Core selects; rows are tuples which must
+    include the id and sort key columns.
+'''
+
+
+'''
+encode_cursor(sort, value, id)
+    returns an opaque cursor pointing after the given row
+'''
+
+
+def encode_cursor(sort, value, id):
+    if isinstance(value, datetime.date):
+        value = value.strftime('%Y-%m-%d')
+    raw = json.dumps({'s': sort, 'v': value, 'id': id},
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')) \
+        .decode('ascii').rstrip('=')
+
+
+'''
+decode_cursor(cursor, sort, column)
+    returns (value, id) of a cursor made by encode_cursor
+    it raises ValueError if the cursor is malformed
+        or was made for another sort key
+'''
+
+
+def decode_cursor(cursor, sort, column):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        decoded = json.loads(
+            base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        value = decoded['v']
+        id = int(decoded['id'])
+        if isinstance(column.type, Date):
+            value = datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except Exception:
+        raise ValueError('invalid cursor')
+
+    if decoded.get('s') != sort:
+        raise ValueError('cursor does not match the sort key')
+
+    return value, id
+
+
+'''
+sort_column(model, sort)
+    returns the column of a sortable field of the model
+    (sort may be prefixed with - for the descending order)
+    it raises ValueError if the field can not be sorted
+'''
+
+
+def sort_column(model, sort):
+    name = sort[1:] if is_descending(sort) else sort
+    if name not in model.SORT_COLUMNS:
+        raise ValueError('sort must be one of {} (prefixed with - for '
+                         'the descending order)'.format(
+                             ', '.join(model.SORT_COLUMNS)))
+    return getattr(model, name)
+
+
+def is_descending(sort):
+    return sort.startswith('-')
+
+
+'''
+sort_order(model, column, descending)
+    the ORDER BY of a page: the sort key, then the id as tie breaker
+'''
+
+
+def sort_order(model, column, descending):
+    order = (model.id,) if column is model.id else (column, model.id)
+    if descending:
+        order = tuple(column.desc() for column in order)
+    return order
+
+
+'''
+seek_after(model, column, value, id, descending=False)
+    filter criterion selecting rows after (value, id) in (column, id) order
+'''
+
+
+def seek_after(model, column, value, id, descending=False):
+    if column is model.id:
+        return model.id < id if descending else model.id > id
+    if db.engine.dialect.name == 'postgresql':
+        # row value comparison lets postgres range scan (column, id)
+        if descending:
+            return tuple_(column, model.id) < tuple_(value, id)
+        return tuple_(column, model.id) > tuple_(value, id)
+    if descending:
+        return or_(column < value, and_(column == value, model.id < id))
+    return or_(column > value, and_(column == value, model.id > id))
+
+
+'''
+keyset_page(model, per_page, sort='id', cursor=None, query=None)
+    returns (rows, next_cursor) of the page following the cursor
+    (the first page if cursor is empty). next_cursor is None
+    when there are no more rows.
+    query is a Core select, all the columns of the model by default
+'''
+
+
+def keyset_page(model, per_page, sort='id', cursor=None, query=None):
+    column = sort_column(model, sort)
+    descending = is_descending(sort)
+    if query is None:
+        query = select([model.__table__])
+    if cursor:
+        value, id = decode_cursor(cursor, sort, column)
+        query = query.where(
+            seek_after(model, column, value, id, descending))
+
+    rows = db.session.execute(
+        query.order_by(*sort_order(model, column, descending))
+        .limit(per_page + 1)).fetchall()
+    return page_result(rows, per_page, sort, column)
+
+
+'''
+offset_page(model, page, per_page, sort='id', query=None)
+    returns (rows, next_cursor) of a numbered page (LIMIT/OFFSET)
+    next_cursor lets clients switch to keyset paging from any page
+'''
+
+
+def offset_page(model, page, per_page, sort='id', query=None):
+    column = sort_column(model, sort)
+    if query is None:
+        query = select([model.__table__])
+    rows = db.session.execute(
+        query.order_by(*sort_order(model, column, is_descending(sort)))
+        .limit(per_page + 1)
+        .offset((page - 1) * per_page)).fetchall()
+    return page_result(rows, per_page, sort, column)
+
+
+def page_result(rows, per_page, sort, column):
+    if len(rows) <= per_page:
+        return rows, None
+
+    rows = rows[:per_page]
+    last = rows[-1]
+    return rows, encode_cursor(sort, getattr(last, column.key), last.id)
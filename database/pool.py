@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import (
+    NullPool,
+    QueuePool
+)
+
+'''
+Connection pool
+    the engine options of setup_db come from the environment
+        DB_POOL_SIZE          connections kept open per process (5)
+        DB_MAX_OVERFLOW       extra connections under load (10)
+        DB_POOL_TIMEOUT       seconds to wait for a connection (30)
+        DB_POOL_RECYCLE       seconds before a connection is replaced (1800)
+        DB_POOL_PRE_PING      test connections on checkout (true)
+        DB_STATEMENT_TIMEOUT  milliseconds per statement, 0 for none
+                              (30000, Postgres only)
+        DB_APPLICATION_NAME   shown in pg_stat_activity (agency_api)
+    the pools are metered: how long checkouts wait for a connection,
+    how many time out, and how much of the pool is in use.
+    SQLite files keep a pool without queue (a connection per checkout).
+'''
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() \
+    in ('1', 'true', 'yes')
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))
+DB_APPLICATION_NAME = os.environ.get('DB_APPLICATION_NAME', 'agency_api')
+
+
+'''
+PoolMeter
+    counts the checkouts of a pool and the time they waited
+'''
+
+
+class PoolMeter():
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def observe(self, wait, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            if timed_out:
+                self.timeouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_ms_avg': round(
+                    self.wait_total / self.checkouts * 1000, 3)
+                if self.checkouts else 0.0,
+                'wait_ms_max': round(self.wait_max * 1000, 3)
+            }
+
+
+class MeteredPool():
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.meter = PoolMeter()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            self.meter.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        self.meter.observe(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() replaces the pool, the counters carry over
+        pool = super().recreate()
+        pool.meter = self.meter
+        return pool
+
+
+class MeteredQueuePool(MeteredPool, QueuePool):
+    pass
+
+
+class MeteredNullPool(MeteredPool, NullPool):
+    pass
+
+
+'''
+engine_options(database_uri)
+    returns the SQLALCHEMY_ENGINE_OPTIONS of a database
+'''
+
+
+def engine_options(database_uri):
+    if database_uri is None:
+        return {}
+    url = make_url(database_uri)
+    backend = url.get_backend_name()
+    if backend == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}  # one shared connection (StaticPool)
+        return {'poolclass': MeteredNullPool}
+
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING
+    }
+    if backend in ('postgres', 'postgresql'):
+        connect_args = {'application_name': DB_APPLICATION_NAME}
+        if DB_STATEMENT_TIMEOUT > 0:
+            connect_args['options'] = \
+                f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+        options['connect_args'] = connect_args
+    return options
+
+
+'''
+pool_stats(engine)
+    the metrics of the pool of an engine
+    saturation: the share of the connections (pool size and overflow)
+    checked out, None when the pool has no limit
+'''
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    meter = getattr(pool, 'meter', None)
+    if meter is not None:
+        stats.update(meter.stats())
+    if isinstance(pool, QueuePool):
+        checked_out = pool.checkedout()
+        limit = pool.size() + pool._max_overflow
+        stats.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_out': checked_out,
+            'saturation': round(checked_out / limit, 3)
+            if pool._max_overflow >= 0 and limit else None
+        })
+    return stats
+
+
+'''
+warm_pool(engine, connections)
+    opens connections of the pool of an engine and returns them to it,
+    so the first requests do not pay for the connects
+    returns the number of connections opened
+'''
+
+
+def warm_pool(engine, connections):
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
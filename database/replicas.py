@@ -0,0 +1,210 @@
+import itertools
+import os
+import threading
+import time
+from functools import wraps
+from flask import (
+    current_app,
+    g,
+    has_app_context,
+    has_request_context,
+    request
+)
+from flask_sqlalchemy import (
+    SQLAlchemy,
+    SignallingSession
+)
+from itsdangerous import (
+    BadData,
+    URLSafeSerializer
+)
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+from .pool import engine_options
+
+'''
+Read replicas
+    setup_db(app, replica_uris=[...]) (or DATABASE_REPLICA_URIS, comma
+    separated, with DATABASE_URI) adds read replicas of the primary.
+    the views decorated by @reads_from_replica run all their queries on
+    one replica, taken round robin for each request. everything else,
+    and every write, uses the primary.
+
+    read-your-writes: once a subject (the JWT sub) writes, its reads stay
+    on the primary for READ_YOUR_WRITES_SECONDS, so it sees its changes
+    before the replicas do. the time of the write is signed and handed to
+    the client (a cookie and the X-Last-Write header, which clients
+    without cookies send back), so whichever worker serves its next read
+    knows about it. the signing key is the application's SECRET_KEY;
+    without one, a key generated at import is shared by the workers of a
+    preloaded application only.
+'''
+
+DATABASE_REPLICA_URIS = os.environ.get('DATABASE_REPLICA_URIS', '')
+READ_YOUR_WRITES_SECONDS = float(
+    os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+LAST_WRITE_COOKIE = 'last_write'
+LAST_WRITE_HEADER = 'X-Last-Write'
+# the signing key when no SECRET_KEY is configured
+_process_secret = os.urandom(32)
+
+
+'''
+ReplicaRouter(uris, secret, window)
+    the engines of the replicas, and the signed write tokens which keep
+    the reads of a subject on the primary
+'''
+
+
+class ReplicaRouter():
+
+    def __init__(self, uris, secret=_process_secret,
+                 window=READ_YOUR_WRITES_SECONDS):
+        self.engines = [create_engine(uri, **engine_options(uri))
+                        for uri in uris]
+        self.window = window
+        self._serializer = URLSafeSerializer(secret, salt='read-your-writes')
+        self._next = itertools.cycle(self.engines)
+        self._lock = threading.Lock()
+
+    def next_engine(self):
+        with self._lock:
+            return next(self._next)
+
+    '''
+    write_token(sub, at)
+        a signed token of a write of sub at (time.time())
+    '''
+
+    def write_token(self, sub, at=None):
+        return self._serializer.dumps(
+            {'sub': sub, 'at': time.time() if at is None else at})
+
+    '''
+    pinned(sub, token)
+        whether token is a valid write token of sub whose window
+        is not over
+    '''
+
+    def pinned(self, sub, token):
+        if not token:
+            return False
+        try:
+            write = self._serializer.loads(token)
+            return write['sub'] == sub and \
+                time.time() < float(write['at']) + self.window
+        except (BadData, KeyError, TypeError, ValueError):
+            return False
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose()
+
+
+'''
+setup_replicas(app, uris)
+    replaces the replicas of an application (none if uris is empty)
+'''
+
+
+def setup_replicas(app, uris):
+    router = app.extensions.pop('db_replicas', None)
+    if router is not None:
+        router.dispose()
+    if uris:
+        app.extensions['db_replicas'] = ReplicaRouter(
+            uris, app.secret_key or os.environ.get('SECRET_KEY') or
+            _process_secret)
+
+
+def replica_uris_from_environ():
+    return [uri.strip() for uri in DATABASE_REPLICA_URIS.split(',')
+            if uri.strip()]
+
+
+def get_router():
+    return current_app.extensions.get('db_replicas')
+
+
+'''
+RoutingSession
+    a Flask-SQLAlchemy session which runs the queries of a request on
+    the replica the request was given (g.db_replica)
+    flushes and INSERT / UPDATE / DELETE statements use the primary
+'''
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_app_context() and not self._flushing and \
+                not isinstance(clause, UpdateBase):
+            replica = g.get('db_replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+'''
+@reads_from_replica
+    a view (after @requires_auth) whose queries may run on a replica
+    put it above @conditional_get so the table versions of the ETag
+    are read from the same replica as the rows
+'''
+
+
+def reads_from_replica(f):
+    @wraps(f)
+    def wrapper(payload, *args, **kwargs):
+        router = get_router()
+        token = request.headers.get(LAST_WRITE_HEADER) or \
+            request.cookies.get(LAST_WRITE_COOKIE)
+        if router is not None and not router.pinned(payload.get('sub'),
+                                                    token):
+            g.db_replica = router.next_engine()
+        return f(payload, *args, **kwargs)
+
+    return wrapper
+
+
+'''
+pin_writer(table_name)
+    a write listener which pins the subject of the request to the primary
+    (the write token is sent by install_read_your_writes)
+'''
+
+
+def pin_writer(table_name):
+    if not has_request_context():
+        return
+    router = get_router()
+    payload = g.get('jwt_payload')
+    if router is not None and payload is not None:
+        g.db_write_token = router.write_token(payload.get('sub'))
+
+
+'''
+install_read_your_writes(app)
+    sends the write token of a request which wrote to the client,
+    as a cookie and as the X-Last-Write header
+'''
+
+
+def install_read_your_writes(app):
+    @app.after_request
+    def send_write_token(response):
+        token = g.get('db_write_token')
+        if token is not None:
+            response.set_cookie(
+                LAST_WRITE_COOKIE, token,
+                max_age=int(get_router().window) + 1,
+                secure=request.is_secure, httponly=True, samesite='Lax')
+            response.headers[LAST_WRITE_HEADER] = token
+        return response
@@ -0,0 +1,126 @@
+import re
+from sqlalchemy import (
+    DDL,
+    event,
+    func,
+    literal_column,
+    table,
+    column,
+    text
+)
+from .models import (
+    db,
+    Actor,
+    Movie
+)
+
+'''
+Full-text search
+    names of actors and titles of movies are searched through
+    database-native indexes
+        SQLite: an FTS5 table (external content) per model, kept in sync
+            by triggers, ranked by bm25
+        Postgres: a GIN index of to_tsvector('simple', column),
+            ranked by ts_rank
+    other databases fall back to LIKE, ranked by id.
+    the last word of a query matches as a prefix ("tom ha" finds
+    "Tom Hanks"). the indexes are created with the tables, and by
+    the alembic revision for existing databases.
+'''
+
+# model: (searched column, fts5 table, postgres index)
+SEARCH_INDEXES = {
+    Actor: ('name', 'actor_fts', 'ix_actor_name_tsv'),
+    Movie: ('title', 'movie_fts', 'ix_movie_title_tsv')
+}
+
+
+def sqlite_ddl(table_name, column_name, fts):
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5('
+        f'{column_name}, content=\'{table_name}\', content_rowid=\'id\')',
+        f'INSERT INTO {fts}({fts}) VALUES (\'rebuild\')',
+        f'CREATE TRIGGER {fts}_insert AFTER INSERT ON "{table_name}" '
+        f'BEGIN INSERT INTO {fts}(rowid, {column_name}) '
+        f'VALUES (new.id, new.{column_name}); END',
+        f'CREATE TRIGGER {fts}_delete AFTER DELETE ON "{table_name}" '
+        f'BEGIN INSERT INTO {fts}({fts}, rowid, {column_name}) '
+        f'VALUES (\'delete\', old.id, old.{column_name}); END',
+        f'CREATE TRIGGER {fts}_update AFTER UPDATE OF {column_name} '
+        f'ON "{table_name}" '
+        f'BEGIN INSERT INTO {fts}({fts}, rowid, {column_name}) '
+        f'VALUES (\'delete\', old.id, old.{column_name}); '
+        f'INSERT INTO {fts}(rowid, {column_name}) '
+        f'VALUES (new.id, new.{column_name}); END'
+    ]
+
+
+def postgres_ddl(table_name, column_name, index):
+    return [
+        f'CREATE INDEX IF NOT EXISTS {index} ON "{table_name}" '
+        f'USING gin (to_tsvector(\'simple\', {column_name}))'
+    ]
+
+
+# create the search indexes with the tables (db.create_all)
+for model, (column_name, fts, index) in SEARCH_INDEXES.items():
+    name = model.__tablename__
+    for statement in sqlite_ddl(name, column_name, fts):
+        event.listen(model.__table__, 'after_create',
+                     DDL(statement).execute_if(dialect='sqlite'))
+    event.listen(model.__table__, 'before_drop',
+                 DDL(f'DROP TABLE IF EXISTS {fts}')
+                 .execute_if(dialect='sqlite'))
+    for statement in postgres_ddl(name, column_name, index):
+        event.listen(model.__table__, 'after_create',
+                     DDL(statement).execute_if(dialect='postgresql'))
+
+
+'''
+search_words(q)
+    the words of a query
+    it raises ValueError if there are none
+'''
+
+
+def search_words(q):
+    words = re.findall(r'\w+', q or '')
+    if not words:
+        raise ValueError('q must contain a word')
+    return words
+
+
+'''
+search_select(model, q, fields)
+    a Core select of the columns of fields (and id) of the rows
+    matching every word of q, best match first
+'''
+
+
+def search_select(model, q, fields):
+    words = search_words(q)
+    column_name, fts, index = SEARCH_INDEXES[model]
+    searched = getattr(model, column_name)
+    query = model.select_fields(fields, 'id')
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{word}"' for word in words) + '*'
+        fts_table = table(fts, column('rowid'))
+        return query \
+            .select_from(model.__table__.join(
+                fts_table, fts_table.c.rowid == model.id)) \
+            .where(text(f'{fts} MATCH :match').bindparams(match=match)) \
+            .order_by(text(f'bm25({fts})'), model.id)
+
+    if dialect == 'postgresql':
+        config = literal_column("'simple'::regconfig")
+        vector = func.to_tsvector(config, searched)
+        tsquery = func.to_tsquery(config, ' & '.join(words) + ':*')
+        return query \
+            .where(vector.op('@@')(tsquery)) \
+            .order_by(func.ts_rank(vector, tsquery).desc(), model.id)
+
+    for word in words:
+        query = query.where(searched.ilike(f'%{word}%'))
+    return query.order_by(model.id)
@@ -0,0 +1,121 @@
+from collections import Counter
+from sqlalchemy import (
+    func,
+    select
+)
+from .models import (
+    db,
+    Stat,
+    Actor,
+    Movie
+)
+
+'''
+Summary statistics
+    the counts of the STATS of each model are kept in the stat table by
+    the writes of the Helper methods (see update_stats), so reading them
+    does not scan the tables. recompute() counts them again with a
+    GROUP BY over the STAT_COLUMNS, to rebuild or check the summaries.
+'''
+
+STAT_MODELS = (Actor, Movie)
+
+
+'''
+recompute(model)
+    returns {(name, bucket): count} of the model's table, counted by
+    a GROUP BY of the STAT_COLUMNS
+'''
+
+
+def recompute(model):
+    table = model.__table__
+    columns = [table.c[name] for name in model.STAT_COLUMNS]
+    counts = Counter()
+    for row in db.session.execute(
+            select(columns + [func.count().label('rows')])
+            .group_by(*columns)):
+        for name, bucket in model.STATS.items():
+            counts[(name, bucket(row))] += row.rows
+    return counts
+
+
+'''
+stored(model)
+    returns {(name, bucket): count} of the model's summary rows
+    (zero counts left out)
+'''
+
+
+def stored(model):
+    table = Stat.__table__
+    return Counter({
+        (row.name, row.bucket): row.count
+        for row in db.session.execute(
+            select([table.c.name, table.c.bucket, table.c.count])
+            .where(table.c.table == model.__tablename__))
+        if row.count
+    })
+
+
+'''
+rebuild()
+    replaces every summary row by a recomputation in one transaction,
+    which bumps the versions of the tables (the ETags of GET /stats)
+    returns the number of summary rows written
+'''
+
+
+def rebuild():
+    table = Stat.__table__
+    rows = []
+    for model in STAT_MODELS:
+        rows += [{'table': model.__tablename__, 'name': name,
+                  'bucket': bucket, 'count': count}
+                 for (name, bucket), count in recompute(model).items()]
+    db.session.execute(table.delete())
+    if rows:
+        db.session.execute(table.insert(), rows)
+    STAT_MODELS[0].commit_write(count_changed=False, also=STAT_MODELS[1:])
+    return len(rows)
+
+
+'''
+check()
+    compares the summary rows with a recomputation
+    returns the differences as dicts of table, name, bucket,
+    stored and expected counts (empty if they are consistent)
+'''
+
+
+def check():
+    differences = []
+    for model in STAT_MODELS:
+        expected = recompute(model)
+        actual = stored(model)
+        for key in sorted(set(expected) | set(actual)):
+            if expected[key] != actual[key]:
+                differences.append({
+                    'table': model.__tablename__,
+                    'name': key[0],
+                    'bucket': key[1],
+                    'stored': actual[key],
+                    'expected': expected[key]
+                })
+    return differences
+
+
+'''
+summary(model)
+    the statistics of a model for GET /stats
+    the total is a number, the other statistics {bucket: count}
+'''
+
+
+def summary(model):
+    result = {name: {} for name in model.STATS}
+    for (name, bucket), count in stored(model).items():
+        if name in result:
+            result[name][bucket] = count
+    result['total'] = result.get('total', {}).get('all', 0)
+    return result
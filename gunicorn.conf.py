@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+
+'''
+gunicorn configuration
+    gunicorn -c gunicorn.conf.py agency_api:app
+        workers   WEB_CONCURRENCY, or 2 per CPU + 1
+        threads   GUNICORN_THREADS per worker (4): gthread workers, or
+                  sync workers with 1
+        GUNICORN_WORKER_CLASS overrides the class, e.g. for the ASGI
+        mode: GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker
+              gunicorn -c gunicorn.conf.py asgi:application
+    the application is imported once by the master (preload_app) and
+    shared copy-on-write. each worker then drops the database
+    connections it inherited and warms up (signing keys, connection
+    pool, hot queries) before it accepts requests.
+    keep workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the
+    connection limit of the database.
+'''
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS',
+                              'gthread' if threads > 1 else 'sync')
+preload_app = True
+# gthread workers keep idle connections open, sync workers ignore it
+keepalive = 5
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    from agency_api import app
+    from database.models import dispose_engines
+    dispose_engines(app)
+
+
+def post_worker_init(worker):
+    from agency_api import warmup
+    timings = warmup(connections=threads)
+    worker.log.info('worker %s warmed up: %s', worker.pid, timings)
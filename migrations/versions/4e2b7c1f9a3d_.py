@@ -0,0 +1,34 @@
+"""add filter and sort indexes
+
+Revision ID: 4e2b7c1f9a3d
+Revises: d9ca2b229d6c
+Create Date: 2026-10-18 14:03:52.417208
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4e2b7c1f9a3d'
+down_revision = 'd9ca2b229d6c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_actor_gender_age_id', 'Actor',
+                    ['gender', 'age', 'id'], unique=False)
+    op.create_index('ix_actor_age_id', 'Actor', ['age', 'id'], unique=False)
+    op.create_index('ix_actor_name_id', 'Actor', ['name', 'id'], unique=False)
+    op.create_index('ix_movie_release_date_id', 'Movie',
+                    ['release_date', 'id'], unique=False)
+    op.create_index('ix_movie_title_id', 'Movie', ['title', 'id'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_movie_title_id', table_name='Movie')
+    op.drop_index('ix_movie_release_date_id', table_name='Movie')
+    op.drop_index('ix_actor_name_id', table_name='Actor')
+    op.drop_index('ix_actor_age_id', table_name='Actor')
+    op.drop_index('ix_actor_gender_age_id', table_name='Actor')
@@ -0,0 +1,64 @@
+"""add full-text search indexes
+
+Revision ID: 8c5d3e2a1b7f
+Revises: 4e2b7c1f9a3d
+Create Date: 2026-10-18 15:21:07.662910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c5d3e2a1b7f'
+down_revision = '4e2b7c1f9a3d'
+branch_labels = None
+depends_on = None
+
+# (table, searched column, fts5 table on sqlite, gin index on postgres)
+SEARCH_INDEXES = [
+    ('Actor', 'name', 'actor_fts', 'ix_actor_name_tsv'),
+    ('Movie', 'title', 'movie_fts', 'ix_movie_title_tsv')
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, column, fts, index in SEARCH_INDEXES:
+        if dialect == 'sqlite':
+            op.execute(
+                f'CREATE VIRTUAL TABLE {fts} USING fts5('
+                f'{column}, content=\'{table}\', content_rowid=\'id\')')
+            # index the existing rows
+            op.execute(f'INSERT INTO {fts}({fts}) VALUES (\'rebuild\')')
+            op.execute(
+                f'CREATE TRIGGER {fts}_insert AFTER INSERT ON "{table}" '
+                f'BEGIN INSERT INTO {fts}(rowid, {column}) '
+                f'VALUES (new.id, new.{column}); END')
+            op.execute(
+                f'CREATE TRIGGER {fts}_delete AFTER DELETE ON "{table}" '
+                f'BEGIN INSERT INTO {fts}({fts}, rowid, {column}) '
+                f'VALUES (\'delete\', old.id, old.{column}); END')
+            op.execute(
+                f'CREATE TRIGGER {fts}_update AFTER UPDATE OF {column} '
+                f'ON "{table}" '
+                f'BEGIN INSERT INTO {fts}({fts}, rowid, {column}) '
+                f'VALUES (\'delete\', old.id, old.{column}); '
+                f'INSERT INTO {fts}(rowid, {column}) '
+                f'VALUES (new.id, new.{column}); END')
+        elif dialect == 'postgresql':
+            op.create_index(index, table,
+                            [sa.text(f"to_tsvector('simple', {column})")],
+                            postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table, column, fts, index in SEARCH_INDEXES:
+        if dialect == 'sqlite':
+            op.execute(f'DROP TRIGGER {fts}_update')
+            op.execute(f'DROP TRIGGER {fts}_delete')
+            op.execute(f'DROP TRIGGER {fts}_insert')
+            op.execute(f'DROP TABLE {fts}')
+        elif dialect == 'postgresql':
+            op.drop_index(index, table_name=table)
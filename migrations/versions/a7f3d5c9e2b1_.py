@@ -0,0 +1,38 @@
+"""add Cast
+
+Revision ID: a7f3d5c9e2b1
+Revises: 8c5d3e2a1b7f
+Create Date: 2026-10-18 16:40:18.093126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7f3d5c9e2b1'
+down_revision = '8c5d3e2a1b7f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Cast',
+    sa.Column('movie_id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['Actor.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['movie_id'], ['Movie.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('movie_id', 'actor_id')
+    )
+    op.create_index('ix_cast_actor_id_movie_id', 'Cast',
+                    ['actor_id', 'movie_id'], unique=False)
+    op.bulk_insert(sa.table('table_version',
+                            sa.column('name', sa.String),
+                            sa.column('version', sa.Integer)),
+                   [{'name': 'Cast', 'version': 0}])
+
+
+def downgrade():
+    op.execute("DELETE FROM table_version WHERE name = 'Cast'")
+    op.drop_index('ix_cast_actor_id_movie_id', table_name='Cast')
+    op.drop_table('Cast')
@@ -0,0 +1,32 @@
+"""add table_version
+
+Revision ID: d9ca2b229d6c
+Revises: 65dcb5da1d65
+Create Date: 2026-10-18 10:12:31.204519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9ca2b229d6c'
+down_revision = '65dcb5da1d65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_version = op.create_table('table_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_version, [
+        {'name': 'Actor', 'version': 0},
+        {'name': 'Movie', 'version': 0}
+    ])
+
+
+def downgrade():
+    op.drop_table('table_version')
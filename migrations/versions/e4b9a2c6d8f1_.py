@@ -0,0 +1,57 @@
+"""add stat
+
+Revision ID: e4b9a2c6d8f1
+Revises: a7f3d5c9e2b1
+Create Date: 2026-10-18 18:02:44.517302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b9a2c6d8f1'
+down_revision = 'a7f3d5c9e2b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    stat = op.create_table('stat',
+    sa.Column('table', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('bucket', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('table', 'name', 'bucket')
+    )
+
+    # backfill the counts of the existing rows (the STATS of the models,
+    # as database/stats.py recomputes them) so the incremental updates
+    # start from the right base
+    actor = sa.table('actor', sa.column('gender', sa.String),
+                     sa.column('age', sa.Integer))
+    movie = sa.table('movie', sa.column('release_date', sa.Date))
+    decade = actor.c.age / 10 * 10
+    year = sa.cast(sa.extract('year', movie.c.release_date), sa.Integer)
+    stats = [
+        (actor, 'total', sa.literal('all')),
+        (actor, 'by_gender', actor.c.gender),
+        (actor, 'by_age', sa.cast(decade, sa.String) + '-' +
+         sa.cast(decade + 9, sa.String)),
+        (movie, 'total', sa.literal('all')),
+        (movie, 'by_release_year', sa.cast(year, sa.String))
+    ]
+    for table, name, bucket in stats:
+        query = sa.select([sa.literal(table.name), sa.literal(name),
+                           bucket, sa.func.count()]).select_from(table)
+        if name == 'total':
+            # one row, left out for an empty table
+            query = query.having(sa.func.count() > 0)
+        else:
+            query = query.group_by(bucket)
+        op.execute(stat.insert().from_select(
+            ['table', 'name', 'bucket', 'count'], query))
+
+
+def downgrade():
+    op.drop_table('stat')
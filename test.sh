@@ -1,4 +1,13 @@
 export PYTHONPATH=$PWD
+# every suite in test/, so a new suite runs from the commit adding it
+for suite in test/test_*.py
+do
+    python "$suite"
+done
+
+# the same suites through the ASGI adapter (asgi.py)
+export SERVER_MODE=asgi
 python test/test_casting_assistant.py
 python test/test_casting_director.py
-python test/test_executive_producer.py
\ No newline at end of file
+python test/test_executive_producer.py
+python test/test_replicas.py
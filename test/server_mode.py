@@ -0,0 +1,20 @@
+import os
+from a2wsgi import (
+    ASGIMiddleware,
+    WSGIMiddleware
+)
+
+'''
+serve(app)
+    with SERVER_MODE=asgi, sends every request made to app (e.g. by the
+    test client) through a2wsgi's ASGI bridge, as asgi.py does, so the
+    suites can run a second time over ASGI (see test.sh)
+    returns app
+'''
+
+
+def serve(app):
+    if os.environ.get('SERVER_MODE') == 'asgi' and \
+            not isinstance(app.wsgi_app, ASGIMiddleware):
+        app.wsgi_app = ASGIMiddleware(WSGIMiddleware(app.wsgi_app))
+    return app
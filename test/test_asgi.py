@@ -0,0 +1,166 @@
+import asyncio
+import json
+import unittest
+import asgi
+from asgi import application
+from auth.jwks import (
+    JWKSCache,
+    async_url_fetcher
+)
+from agency_api import app
+from auth.issuer import get_local_issuer
+from database.models import (
+    setup_db,
+    db_drop_and_create_all,
+    db,
+    Actor
+)
+
+
+class ASGITestCase(unittest.TestCase):
+
+    def setUp(self):
+        setup_db(app, database_filename='database_test.db')
+        with app.app_context():
+            db_drop_and_create_all()
+        issuer = get_local_issuer()
+        issuer.install()
+        self.token = issuer.role_token('PRODUCER')
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+        self.loop.close()
+
+    def run_request(self, method, path, chunks=(b'',), query_string=b''):
+        # sends a request to asgi.application, its body in chunks
+        chunks = list(chunks)
+        scope = {'type': 'http', 'http_version': '1.1', 'method': method,
+                 'path': path, 'query_string': query_string,
+                 'headers': [
+                     (b'host', b'localhost'),
+                     (b'authorization', f'Bearer {self.token}'.encode()),
+                     (b'content-length',
+                      str(sum(len(chunk) for chunk in chunks)).encode())]}
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': chunks.pop(0),
+                    'more_body': bool(chunks)}
+
+        async def send(message):
+            sent.append(message)
+
+        self.loop.run_until_complete(application(scope, receive, send))
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        return sent[0]['status'], body
+
+    def test_request(self):
+        status, body = self.run_request('GET', '/actors')
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body)['success'])
+
+    def test_import_streamed(self):
+        # the body is read by the route as it arrives, in chunks
+        body = b'name,age,gender\n' + b''.join(
+            f'Imported{i},30,F\n'.encode('utf-8') for i in range(2000))
+        chunks = [body[i:i + 1000] for i in range(0, len(body), 1000)]
+        status, data = self.run_request(
+            'POST', '/actors/import', chunks, b'format=csv&chunk_size=100')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(data)['imported'], 2000)
+        with app.app_context():
+            self.assertEqual(Actor.query.count(), 2000)
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+        sent = []
+        refreshing = []
+
+        async def receive():
+            if not messages[0]['type'].endswith('startup'):
+                # the JWKS refresh runs between startup and shutdown
+                refreshing.extend(asgi._tasks)
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        self.loop.run_until_complete(
+            application({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
+        self.assertEqual(len(refreshing), 1)
+        self.assertEqual(asgi._tasks, [])
+
+
+class AsyncJWKSTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.jwks = get_local_issuer().jwks()
+        self.requests = 0
+
+    def tearDown(self):
+        self.loop.close()
+
+    def serve(self, status=b'200 OK', padding=0):
+        async def handle(reader, writer):
+            self.requests += 1
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.0 ' + status + b'\r\n'
+                         b'Content-Type: application/json\r\n\r\n' +
+                         json.dumps(self.jwks).encode() + b' ' * padding)
+            await writer.drain()
+            writer.close()
+
+        server = self.loop.run_until_complete(
+            asyncio.start_server(handle, '127.0.0.1', 0))
+        port = server.sockets[0].getsockname()[1]
+        return server, f'http://127.0.0.1:{port}/.well-known/jwks.json'
+
+    def test_refresh_async(self):
+        server, url = self.serve()
+        cache = JWKSCache(lambda: self.fail('sync fetch'),
+                          async_fetcher=async_url_fetcher(url))
+        self.assertTrue(self.loop.run_until_complete(cache.refresh_async()))
+        kid = self.jwks['keys'][0]['kid']
+        self.assertIsNotNone(cache.get_key(kid))
+        server.close()
+
+    def test_refresh_async_error(self):
+        server, url = self.serve(b'503 Service Unavailable')
+        cache = JWKSCache(lambda: self.jwks, failure_threshold=1,
+                          async_fetcher=async_url_fetcher(url))
+        self.assertFalse(self.loop.run_until_complete(cache.refresh_async()))
+        # the breaker is open: no more fetches
+        self.assertFalse(self.loop.run_until_complete(cache.refresh_async()))
+        self.assertEqual(self.requests, 1)
+        server.close()
+
+    def test_refresh_async_too_large(self):
+        server, url = self.serve(padding=2048)
+        cache = JWKSCache(lambda: self.jwks, failure_threshold=1,
+                          async_fetcher=async_url_fetcher(url,
+                                                          max_bytes=1024))
+        self.assertFalse(self.loop.run_until_complete(cache.refresh_async()))
+        server.close()
+
+    def test_keep_fresh(self):
+        server, url = self.serve()
+        cache = JWKSCache(lambda: self.jwks, ttl=0.05,
+                          async_fetcher=async_url_fetcher(url))
+        task = self.loop.create_task(cache.keep_fresh())
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            self.loop.run_until_complete(task)
+        self.assertGreater(self.requests, 2)
+        server.close()
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from flask import Flask
+from auth.auth import (
+    AuthError,
+    check_permissions,
+    get_token_auth_header,
+    token_cache,
+    verify_decode_jwt
+)
+from auth.issuer import (
+    LocalIssuer,
+    get_local_issuer,
+    ROLE_PERMISSIONS
+)
+
+
+class AuthTestCase(unittest.TestCase):
+
+    def setUp(self):
+        '''
+            Verify tokens against the local issuer
+        '''
+        self.issuer = get_local_issuer()
+        self.issuer.install()
+        self.app = Flask(__name__)
+
+    def test_get_token_auth_header(self):
+        # success
+        headers = {'Authorization': 'Bearer token'}
+        with self.app.test_request_context(headers=headers):
+            self.assertEqual(get_token_auth_header(), 'token')
+
+    def test_error_get_token_auth_header(self):
+        # missing or malformed header
+        for headers in ({}, {'Authorization': 'Basic token'},
+                        {'Authorization': 'Bearer'},
+                        {'Authorization': 'Bearer a b'}):
+            with self.app.test_request_context(headers=headers):
+                with self.assertRaises(AuthError):
+                    get_token_auth_header()
+
+    def test_verify_decode_jwt(self):
+        # success
+        payload = verify_decode_jwt(self.issuer.role_token('DIRECTOR'))
+        self.assertEqual(payload['permissions'],
+                         ROLE_PERMISSIONS['DIRECTOR'])
+
+    def test_verify_decode_jwt_cached(self):
+        # a token verified before is served from the cache
+        token = self.issuer.role_token('PRODUCER')
+        verify_decode_jwt(token)
+        hits = token_cache.stats()['hits']
+        self.assertEqual(verify_decode_jwt(token)['permissions'],
+                         ROLE_PERMISSIONS['PRODUCER'])
+        self.assertEqual(token_cache.stats()['hits'], hits + 1)
+
+    def test_error_verify_decode_jwt_expired(self):
+        # an expired token is rejected without fetching keys
+        fetches = self.issuer.fetches
+        token = self.issuer.role_token('ASSISTANT', expires_in=-10)
+        with self.assertRaises(AuthError) as context:
+            verify_decode_jwt(token)
+        self.assertEqual(context.exception.status_code, 401)
+        self.assertEqual(self.issuer.fetches, fetches)
+
+    def test_error_verify_decode_jwt_foreign_key(self):
+        # a token signed by an unknown key is rejected
+        foreign = LocalIssuer(kid='foreign', bits=1024)
+        with self.assertRaises(AuthError):
+            verify_decode_jwt(foreign.role_token('PRODUCER'))
+
+    def test_error_verify_decode_jwt_audience(self):
+        # a token for another audience is rejected
+        token = self.issuer.token(['get:actors'], aud='other')
+        with self.assertRaises(AuthError) as context:
+            verify_decode_jwt(token)
+        self.assertEqual(context.exception.status_code, 401)
+
+    def test_check_permissions(self):
+        # success and failure
+        payload = {'permissions': ['get:actors']}
+        check_permissions('get:actors', payload)
+        with self.assertRaises(AuthError):
+            check_permissions('post:actors', payload)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -15,7 +15,8 @@ from agency_api import (
     format_age,
     format_gender
 )
-import os
+from auth.issuer import get_local_issuer
+from test.server_mode import serve
 
 
 class ExecutiveProducerTestCase(unittest.TestCase):
@@ -24,14 +25,16 @@ class ExecutiveProducerTestCase(unittest.TestCase):
         '''
             Define test variables and initialize app.
         '''
-        self.app = app
+        self.app = serve(app)
         self.client = self.app.test_client
         setup_db(self.app, database_filename="database_test.db")
 
-        # set access token for this role
+        # set access token for this role (signed by the local issuer)
+        issuer = get_local_issuer()
+        issuer.install()
         self.headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {os.environ.get('ASSISTANT')}"
+            "Authorization": f"Bearer {issuer.role_token('ASSISTANT')}"
         }
 
         # binds the app to the current context
@@ -55,6 +58,14 @@ class ExecutiveProducerTestCase(unittest.TestCase):
         GET
     '''
 
+    def test_error_get_metrics(self):
+        # no authentication
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 401)
+        # no permission (get:metrics)
+        res = self.client().get('/metrics', headers=self.headers)
+        self.assertEqual(res.status_code, 401)
+
     def test_get_actors(self):
         # success
         res = self.client().get('/actors', headers=self.headers)
@@ -67,6 +78,14 @@ class ExecutiveProducerTestCase(unittest.TestCase):
         res = self.client().get('/actors')
         self.assertEqual(res.status_code, 401)
 
+    def test_get_actor(self):
+        # success
+        id = Actor.query.first().id
+        res = self.client().get(f'/actors/{id}?fields=name',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['actor'], {'name': 'first_actor'})
+
     def test_get_movies(self):
         # success
         res = self.client().get('/movies', headers=self.headers)
@@ -104,6 +123,13 @@ class ExecutiveProducerTestCase(unittest.TestCase):
                                  headers=self.headers, json=req_data)
         self.assertEqual(res.status_code, 401)
 
+    def test_error_post_actors_bulk(self):
+        # no permission
+        req_data = [{'name': 'Actor1', 'age': 30, 'gender': 'F'}]
+        res = self.client().post('/actors/bulk',
+                                 headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 401)
+
     '''
         PATCH
     '''
@@ -131,6 +157,22 @@ class ExecutiveProducerTestCase(unittest.TestCase):
             f'/movies/{target_id}', headers=self.headers, json=req_data)
         self.assertEqual(res.status_code, 401)
 
+    def test_error_patch_actors_bulk(self):
+        # no permission
+        target_id = Actor.query.all()[-1].id
+        req_data = {'ids': [target_id], 'changes': {'age': 40}}
+        res = self.client().patch('/actors/bulk',
+                                  headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 401)
+
+    def test_error_post_movies_cast(self):
+        # no permission
+        req_data = [{'movie_id': Movie.query.first().id,
+                     'actor_id': Actor.query.first().id}]
+        res = self.client().post('/movies/cast',
+                                 headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 401)
+
     '''
         DELETE
     '''
@@ -15,7 +15,8 @@ from agency_api import (
     format_age,
     format_gender
 )
-import os
+from auth.issuer import get_local_issuer
+from test.server_mode import serve
 
 
 class ExecutiveProducerTestCase(unittest.TestCase):
@@ -24,14 +25,16 @@ class ExecutiveProducerTestCase(unittest.TestCase):
         '''
             Define test variables and initialize app.
         '''
-        self.app = app
+        self.app = serve(app)
         self.client = self.app.test_client
         setup_db(self.app, database_filename="database_test.db")
 
-        # set access token for this role
+        # set access token for this role (signed by the local issuer)
+        issuer = get_local_issuer()
+        issuer.install()
         self.headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {os.environ.get('DIRECTOR')}"
+            "Authorization": f"Bearer {issuer.role_token('DIRECTOR')}"
         }
 
         # binds the app to the current context
@@ -144,6 +147,20 @@ class ExecutiveProducerTestCase(unittest.TestCase):
                                  headers=self.headers, json=req_data)
         self.assertEqual(res.status_code, 401)
 
+    def test_error_post_movies_bulk(self):
+        # no permission
+        req_data = [{'title': 'Movie1', 'release_date': '2020-12-12'}]
+        res = self.client().post('/movies/bulk',
+                                 headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 401)
+
+    def test_error_import_movies(self):
+        # no permission
+        body = '{"title": "Movie1", "release_date": "2020-12-12"}\n'
+        res = self.client().post('/movies/import',
+                                 headers=self.headers, data=body)
+        self.assertEqual(res.status_code, 401)
+
     '''
         PATCH
     '''
@@ -198,6 +215,18 @@ class ExecutiveProducerTestCase(unittest.TestCase):
             f'/actors/{target_id}', headers=self.headers, json=req_data)
         self.assertEqual(res.status_code, 400)
 
+    def test_post_movies_cast(self):
+        # success
+        movie_id = Movie.query.first().id
+        req_data = [{'movie_id': movie_id,
+                     'actor_id': Actor.query.first().id}]
+        res = self.client().post('/movies/cast',
+                                 headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 200)
+        res = self.client().get(f'/movies/{movie_id}/cast',
+                                headers=self.headers)
+        self.assertEqual(len(res.get_json()['cast']), 1)
+
     def test_patch_movies(self):
         # success
         req_data = {
@@ -249,6 +278,13 @@ class ExecutiveProducerTestCase(unittest.TestCase):
             f'/movies/{target_id}', headers=self.headers)
         self.assertEqual(res.status_code, 401)
 
+    def test_error_delete_movies_bulk(self):
+        # no permission
+        target_id = Movie.query.all()[-1].id
+        res = self.client().delete('/movies/bulk', headers=self.headers,
+                                   json={'ids': [target_id]})
+        self.assertEqual(res.status_code, 401)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
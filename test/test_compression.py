@@ -0,0 +1,120 @@
+import gzip
+import json
+import unittest
+import zlib
+from flask import (
+    Flask,
+    Response,
+    stream_with_context
+)
+from utils import compression
+from utils.compression import (
+    Compressor,
+    install_compression
+)
+from utils.json_encoder import jsonify
+from utils.response_cache import (
+    MemoryBackend,
+    ResponseCache
+)
+
+ROWS = [{'id': id, 'name': f'actor{id}'} for id in range(200)]
+
+
+class CompressionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.cache = ResponseCache(MemoryBackend())
+        install_compression(self.app, self.cache)
+
+        @self.app.route('/large')
+        def large():
+            response = jsonify({'actors': ROWS})
+            response.set_etag('large')
+            response.cache_tags = (['Actor'], 'large')
+            return response
+
+        @self.app.route('/small')
+        def small():
+            return jsonify({'success': True})
+
+        @self.app.route('/stream')
+        def stream():
+            def generate():
+                for row in ROWS:
+                    yield json.dumps(row) + '\n'
+            return Response(stream_with_context(generate()),
+                            mimetype='application/x-ndjson')
+
+        self.client = self.app.test_client
+
+    def test_gzip(self):
+        # a large body is compressed and its etag made weak
+        res = self.client().get('/large', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(res.headers['ETag'], 'W/"large"')
+        self.assertEqual(res.headers['Content-Length'],
+                         str(len(res.get_data())))
+        self.assertEqual(json.loads(gzip.decompress(res.get_data())),
+                         {'actors': ROWS})
+
+    def test_identity(self):
+        # no or unsupported Accept-Encoding
+        for accept in (None, 'deflate', 'gzip;q=0'):
+            headers = {'Accept-Encoding': accept} if accept else {}
+            res = self.client().get('/large', headers=headers)
+            self.assertNotIn('Content-Encoding', res.headers)
+            self.assertEqual(res.headers['ETag'], '"large"')
+            self.assertEqual(res.get_json(), {'actors': ROWS})
+
+    def test_threshold(self):
+        # a body under COMPRESSION_MIN_SIZE is sent as it is
+        res = self.client().get('/small', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+
+    def test_stream(self):
+        # streamed responses are compressed chunk by chunk
+        res = self.client().get('/stream',
+                                headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', res.headers)
+        lines = gzip.decompress(res.get_data()).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], ROWS)
+
+    def test_compressor_flush(self):
+        # each chunk can be decompressed as soon as it is received
+        compressor = Compressor('gzip')
+        chunk = compressor.compress(b'{"id":1}\n')
+        decompressor = zlib.decompressobj(31)
+        self.assertEqual(decompressor.decompress(chunk), b'{"id":1}\n')
+
+    def test_cache(self):
+        # the compressed body is cached next to the response
+        headers = {'Accept-Encoding': 'gzip'}
+        first = self.client().get('/large', headers=headers).get_data()
+        hits = self.cache.stats()['hits']
+        second = self.client().get('/large', headers=headers).get_data()
+        self.assertEqual(second, first)
+        self.assertEqual(self.cache.stats()['hits'], hits + 1)
+
+        # and dropped with it
+        self.cache.invalidate('Actor')
+        self.assertIsNone(self.cache.get(['Actor'], 'large:gzip'))
+
+    @unittest.skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli(self):
+        # br is preferred when both are accepted
+        res = self.client().get('/large',
+                                headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(res.headers['Content-Encoding'], 'br')
+        self.assertEqual(
+            json.loads(compression.brotli.decompress(res.get_data())),
+            {'actors': ROWS})
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
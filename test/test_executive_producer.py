@@ -1,21 +1,29 @@
+import gzip
 import sys
 import os
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from database.models import (
     setup_db,
     db_drop_and_create_all,
+    db,
     Movie,
-    Actor
+    Actor,
+    Cast
 )
+from database import stats
 from agency_api import (
     app,
+    response_cache,
     format_date,
     format_age,
     format_gender
 )
-import os
+from auth.issuer import get_local_issuer
+from test.server_mode import serve
+from utils.json_encoder import dumps
 
 
 class ExecutiveProducerTestCase(unittest.TestCase):
@@ -24,14 +32,16 @@ class ExecutiveProducerTestCase(unittest.TestCase):
         '''
             Define test variables and initialize app.
         '''
-        self.app = app
+        self.app = serve(app)
         self.client = self.app.test_client
         setup_db(self.app, database_filename="database_test.db")
 
-        # set access token for this role
+        # set access token for this role (signed by the local issuer)
+        issuer = get_local_issuer()
+        issuer.install()
         self.headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {os.environ.get('PRODUCER')}"
+            "Authorization": f"Bearer {issuer.role_token('PRODUCER')}"
         }
 
         # binds the app to the current context
@@ -55,6 +65,15 @@ class ExecutiveProducerTestCase(unittest.TestCase):
         GET
     '''
 
+    def test_get_metrics(self):
+        res = self.client().get('/metrics', headers=self.headers)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        pool = data['database_pool']
+        self.assertEqual(pool['pool'], 'MeteredNullPool')
+        self.assertGreater(pool['checkouts'], 0)
+        self.assertEqual(pool['timeouts'], 0)
+
     def test_get_actors(self):
         # success
         res = self.client().get('/actors', headers=self.headers)
@@ -79,6 +98,525 @@ class ExecutiveProducerTestCase(unittest.TestCase):
         res = self.client().get('/movies')
         self.assertEqual(res.status_code, 401)
 
+    def test_get_actors_paging(self):
+        # success
+        for i in range(4):
+            Actor(name=f'paging_actor{i}', age=20 + i, gender='F').insert()
+        res = self.client().get('/actors?page=2&per_page=2',
+                                headers=self.headers)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total'], 5)
+        self.assertEqual(data['per_page'], 2)
+        self.assertEqual([actor['name'] for actor in data['actors']],
+                         ['paging_actor1', 'paging_actor2'])
+
+    def test_get_actors_cursor(self):
+        # success
+        for i in range(4):
+            Actor(name=f'cursor_actor{i}', age=50 - i, gender='M').insert()
+        ages = []
+        cursor = ''
+        while cursor is not None:
+            res = self.client().get('/actors', headers=self.headers,
+                                    query_string={'cursor': cursor,
+                                                  'per_page': 2,
+                                                  'sort': 'age'})
+            data = res.get_json()
+            self.assertEqual(res.status_code, 200)
+            ages += [actor['age'] for actor in data['actors']]
+            cursor = data['next_cursor']
+        self.assertEqual(ages, [30, 47, 48, 49, 50])
+
+    def test_error_get_actors_cursor(self):
+        # malformed cursor
+        res = self.client().get('/actors?cursor=abc', headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+        # unknown sort key
+        res = self.client().get('/actors?sort=height', headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_actors_batch(self):
+        # success (in the requested order)
+        Actor.bulk_insert([{'name': f'BatchActor{i}', 'age': 20,
+                            'gender': 'F'} for i in range(3)])
+        ids = [actor.id for actor in Actor.query.all()]
+        query = ','.join(str(id) for id in [ids[2], 9999, ids[0]])
+        res = self.client().get(f'/actors?ids={query}',
+                                headers=self.headers)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([actor['id'] for actor in data['actors']],
+                         [ids[2], ids[0]])
+        self.assertEqual(data['missing'], [9999])
+
+    def test_error_get_movies_batch(self):
+        # ids are not integers
+        res = self.client().get('/movies?ids=1,two', headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+        # too many ids
+        query = ','.join(str(id) for id in range(1, 200))
+        res = self.client().get(f'/movies?ids={query}',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_actors_fields(self):
+        # only the requested fields (list, batch and single item)
+        id = Actor.query.first().id
+        res = self.client().get('/actors?fields=id,name',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['actors'],
+                         [{'id': id, 'name': 'first_actor'}])
+
+        res = self.client().get(f'/actors?ids={id}&fields=age',
+                                headers=self.headers)
+        self.assertEqual(res.get_json()['actors'], [{'age': 30}])
+
+        res = self.client().get(f'/actors/{id}?fields=gender',
+                                headers=self.headers)
+        self.assertEqual(res.get_json()['actor'], {'gender': 'M'})
+
+    def test_get_movies_fields(self):
+        # the sort key is loaded for the cursor but not returned
+        Movie(title='second_movie',
+              release_date=format_date('2012-12-12')).insert()
+        res = self.client().get('/movies?fields=title&sort=release_date'
+                                '&per_page=1&cursor=',
+                                headers=self.headers)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['movies'], [{'title': 'first_movie'}])
+        res = self.client().get('/movies?fields=release_date'
+                                '&sort=release_date&per_page=1'
+                                f'&cursor={data["next_cursor"]}',
+                                headers=self.headers)
+        self.assertEqual(res.get_json()['movies'],
+                         [{'release_date': '2012-12-12'}])
+
+    def test_get_movies_format(self):
+        # rows read by Core selects are formatted like the models
+        Movie.bulk_insert([{'title': f'FormatMovie{i}',
+                            'release_date': format_date('2001-01-01')}
+                           for i in range(3)])
+        expected = [movie.format()
+                    for movie in Movie.query.order_by(Movie.id).all()]
+        res = self.client().get('/movies', headers=self.headers)
+        self.assertEqual(res.get_json()['movies'],
+                         json.loads(dumps(expected)))
+        res = self.client().get('/movies/export', headers=self.headers)
+        self.assertEqual(res.get_data(),
+                         b''.join(dumps(movie, sort_keys=False) + b'\n'
+                                  for movie in expected))
+
+    def test_error_get_movies_fields(self):
+        # unknown field
+        res = self.client().get('/movies?fields=id,budget',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+        # empty fields
+        id = Movie.query.first().id
+        res = self.client().get(f'/movies/{id}?fields=',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_movie(self):
+        # success
+        id = Movie.query.first().id
+        res = self.client().get(f'/movies/{id}', headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['movie'],
+                         {'id': id, 'title': 'first_movie',
+                          'release_date': '2010-10-08'})
+
+    def test_error_get_actor(self):
+        # not found
+        res = self.client().get('/actors/9999', headers=self.headers)
+        self.assertEqual(res.status_code, 404)
+        res = self.client().get('/actors/first', headers=self.headers)
+        self.assertEqual(res.status_code, 404)
+
+    def test_get_actors_filters(self):
+        # by gender and age range (bounds included)
+        Actor.bulk_insert([{'name': f'FilterActor{age}', 'age': age,
+                            'gender': 'MF'[age % 2]} for age in range(20, 30)])
+        res = self.client().get('/actors?gender=f&min_age=21&max_age=25',
+                                headers=self.headers)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([actor['age'] for actor in data['actors']],
+                         [21, 23, 25])
+        self.assertEqual(data['total'], 3)
+
+    def test_get_actors_sort_descending(self):
+        # descending keyset pages
+        Actor.bulk_insert([{'name': f'SortActor{age}', 'age': age,
+                            'gender': 'F'} for age in (40, 50, 50, 60)])
+        ages = []
+        cursor = ''
+        while cursor is not None:
+            res = self.client().get(f'/actors?sort=-age&per_page=2'
+                                    f'&cursor={cursor}',
+                                    headers=self.headers)
+            data = res.get_json()
+            ages += [actor['age'] for actor in data['actors']]
+            cursor = data['next_cursor']
+        self.assertEqual(ages, [60, 50, 50, 40, 30])
+
+        # the cursor of another order is rejected
+        res = self.client().get('/actors?sort=-age&per_page=2',
+                                headers=self.headers)
+        cursor = res.get_json()['next_cursor']
+        res = self.client().get(f'/actors?sort=age&cursor={cursor}',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_movies_filters(self):
+        # by release date range, newest first
+        Movie.bulk_insert([{'title': f'FilterMovie{year}',
+                            'release_date': format_date(f'{year}-06-01')}
+                           for year in range(2000, 2010)])
+        res = self.client().get('/movies?min_release_date=2003-06-01'
+                                '&max_release_date=2006-01-01'
+                                '&sort=-release_date',
+                                headers=self.headers)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([movie['release_date'] for movie in data['movies']],
+                         ['2005-06-01', '2004-06-01', '2003-06-01'])
+        self.assertEqual(data['total'], 3)
+
+    def test_error_get_actors_filters(self):
+        # invalid values
+        for query in ('gender=X', 'min_age=old', 'max_age=-1',
+                      'min_age=30&max_age=20', 'sort=-gender'):
+            res = self.client().get(f'/actors?{query}', headers=self.headers)
+            self.assertEqual(res.status_code, 400)
+
+        res = self.client().get('/movies?min_release_date=2020-13-01',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+    def test_search_actors(self):
+        # ranked matches, the last word as a prefix
+        Actor.bulk_insert([{'name': name, 'age': 40, 'gender': 'M'}
+                           for name in ('Tom Hardy', 'Tom Tom Hanks',
+                                        'Tim Robbins')])
+        res = self.client().get('/actors/search?q=tom', headers=self.headers)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([actor['name'] for actor in data['actors']],
+                         ['Tom Tom Hanks', 'Tom Hardy'])
+        self.assertFalse(data['has_more'])
+
+        res = self.client().get('/actors/search?q=tom+HAN&fields=name',
+                                headers=self.headers)
+        self.assertEqual(res.get_json()['actors'], [{'name': 'Tom Tom Hanks'}])
+
+        # the index follows updates and deletes
+        robbins = Actor.query.filter_by(name='Tim Robbins').first()
+        Actor.bulk_update({robbins.id: {'name': 'Tom Robbins'}})
+        Actor.bulk_delete([Actor.query.filter_by(name='Tom Hardy')
+                           .first().id])
+        res = self.client().get('/actors/search?q=tom', headers=self.headers)
+        self.assertEqual(sorted(actor['name']
+                                for actor in res.get_json()['actors']),
+                         ['Tom Robbins', 'Tom Tom Hanks'])
+
+    def test_search_movies(self):
+        # paged matches
+        Movie.bulk_insert([{'title': f'Star Wars {i}',
+                            'release_date': format_date('1977-05-25')}
+                           for i in range(3)])
+        res = self.client().get('/movies/search?q=wars&per_page=2',
+                                headers=self.headers)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['movies']), 2)
+        self.assertTrue(data['has_more'])
+        res = self.client().get('/movies/search?q=first', headers=self.headers)
+        self.assertEqual([movie['title'] for movie in
+                          res.get_json()['movies']], ['first_movie'])
+
+    def test_error_search_movies(self):
+        # no words in q
+        for query in ('', '?q=', '?q=%22%2A%29'):
+            res = self.client().get(f'/movies/search{query}',
+                                    headers=self.headers)
+            self.assertEqual(res.status_code, 400)
+
+    def count_queries(self, url):
+        # number of statements sent to the database by a request
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                res = self.client().get(url, headers=self.headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual(res.status_code, 200)
+        return len(statements), res.get_json()
+
+    def test_cast(self):
+        # cast, list and uncast
+        movie = Movie.query.first()
+        Actor.bulk_insert([{'name': f'CastActor{i}', 'age': 30,
+                            'gender': 'F'} for i in range(2)])
+        actor_ids = [actor.id for actor in Actor.query.order_by(Actor.id)]
+        movie_id = movie.id
+        cast = [{'movie_id': movie_id, 'actor_id': id} for id in actor_ids]
+        res = self.client().post('/movies/cast', json=cast,
+                                 headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['cast'], 3)
+
+        # casting again adds nothing
+        res = self.client().post('/movies/cast', json={'cast': cast},
+                                 headers=self.headers)
+        self.assertEqual(res.get_json()['cast'], 0)
+
+        res = self.client().get(f'/movies/{movie_id}/cast?fields=id',
+                                headers=self.headers)
+        self.assertEqual(res.get_json()['cast'],
+                         [{'id': id} for id in actor_ids])
+        res = self.client().get(f'/actors/{actor_ids[1]}/movies',
+                                headers=self.headers)
+        self.assertEqual([movie['title'] for movie in
+                          res.get_json()['movies']], ['first_movie'])
+
+        res = self.client().get(f'/actors?ids={actor_ids[0]}'
+                                '&include=movies', headers=self.headers)
+        self.assertEqual(res.get_json()['actors'][0]['movies'],
+                         [{'id': movie_id, 'title': 'first_movie',
+                           'release_date': '2010-10-08'}])
+
+        res = self.client().delete('/movies/cast', json=cast[:2],
+                                   headers=self.headers)
+        self.assertEqual(res.get_json()['uncast'], 2)
+        res = self.client().get(f'/movies/{movie_id}/cast',
+                                headers=self.headers)
+        self.assertEqual([actor['id'] for actor in res.get_json()['cast']],
+                         actor_ids[2:])
+
+        # deleting the actor removes it from the cast
+        Actor.bulk_delete(actor_ids[2:])
+        self.assertEqual(Cast.query.count(), 0)
+
+    def test_error_cast(self):
+        # unknown movie or actor, invalid items
+        actor_id = Actor.query.first().id
+        res = self.client().post('/movies/cast',
+                                 json=[{'movie_id': 9999,
+                                        'actor_id': actor_id},
+                                       {'movie_id': 1}],
+                                 headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([error['index'] for error in
+                          res.get_json()['errors']], [1])
+        res = self.client().post('/movies/cast',
+                                 json=[{'movie_id': 9999,
+                                        'actor_id': actor_id}],
+                                 headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('movie 9999', res.get_json()['errors'][0]['message'])
+
+        # unknown movie
+        res = self.client().get('/movies/9999/cast', headers=self.headers)
+        self.assertEqual(res.status_code, 404)
+
+    def test_get_movies_include_cast(self):
+        # the cast of a whole page is read by one more query
+        Movie.bulk_insert([{'title': f'CastMovie{i}',
+                            'release_date': format_date('2001-01-01')}
+                           for i in range(99)])
+        Actor.bulk_insert([{'name': f'CastActor{i}', 'age': 30,
+                            'gender': 'M'} for i in range(2)])
+        actor_ids = [actor.id for actor in Actor.query.all()]
+        Cast.bulk_cast([(movie.id, actor_id)
+                        for movie in Movie.query.all()
+                        for actor_id in actor_ids])
+
+        self.count_queries('/movies?per_page=1')  # fill the count cache
+        plain, data = self.count_queries('/movies?per_page=100')
+        small, data = self.count_queries('/movies?per_page=5&include=cast')
+        large, data = self.count_queries('/movies?per_page=100&include=cast')
+        self.assertEqual(large, small)
+        self.assertEqual(large, plain + 1)
+        self.assertEqual(len(data['movies']), 100)
+        for movie in data['movies']:
+            self.assertEqual([actor['id'] for actor in movie['cast']],
+                             sorted(actor_ids))
+
+        # a cast change is a new version of the page
+        res = self.client().get('/movies?per_page=100&include=cast',
+                                headers=self.headers)
+        etag = res.headers['ETag']
+        Cast.bulk_uncast([(data['movies'][0]['id'], actor_ids[0])])
+        res = self.client().get('/movies?per_page=100&include=cast',
+                                headers=dict(self.headers,
+                                             **{'If-None-Match': etag}))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.get_json()['movies'][0]['cast']), 2)
+
+    def test_error_get_actors_include(self):
+        # unknown include
+        res = self.client().get('/actors?include=cast', headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_stats(self):
+        # summaries follow every kind of write
+        Actor.bulk_insert([{'name': f'StatActor{age}', 'age': age,
+                            'gender': 'F'} for age in (25, 31, 38)])
+        Movie.copy_insert([{'title': 'StatMovie',
+                            'release_date': format_date('2012-05-05')}])
+        ids = [actor.id for actor in Actor.query.order_by(Actor.id)]
+        res = self.client().patch(f'/actors/{ids[0]}', json={'age': 41},
+                                  headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        Actor.bulk_update({ids[1]: {'gender': 'M', 'age': 52}})
+        Actor.bulk_delete([ids[2]])
+        Actor.query.get(ids[3]).delete()
+        res = self.client().post('/movies/import?format=csv',
+                                 data='title,release_date\n'
+                                      'ImportedStat,2012-01-01\n',
+                                 headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().get('/stats', headers=self.headers)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['actors'], {
+            'total': 2,
+            'by_gender': {'M': 2},
+            'by_age': {'40-49': 1, '50-59': 1}
+        })
+        self.assertEqual(data['movies'], {
+            'total': 3,
+            'by_release_year': {'2010': 1, '2012': 2}
+        })
+        self.assertEqual(stats.check(), [])
+
+    def test_stats_rebuild(self):
+        res = self.client().get('/stats', headers=self.headers)
+        headers = dict(self.headers, **{'If-None-Match': res.headers['ETag']})
+
+        # a rebuild repairs summaries written around the helpers
+        db.session.execute(Actor.__table__.insert().values(
+            name='RawActor', age=70, gender='M'))
+        db.session.commit()
+        self.assertEqual(stats.check(), [{
+            'table': 'Actor', 'name': 'by_age', 'bucket': '70-79',
+            'stored': 0, 'expected': 1
+        }, {
+            'table': 'Actor', 'name': 'by_gender', 'bucket': 'M',
+            'stored': 1, 'expected': 2
+        }, {
+            'table': 'Actor', 'name': 'total', 'bucket': 'all',
+            'stored': 1, 'expected': 2
+        }])
+        stats.rebuild()
+        self.assertEqual(stats.check(), [])
+
+        # the rebuilt counts are served, not the cached ones
+        res = self.client().get('/stats', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['actors']['total'], 2)
+
+    def test_get_actors_etag(self):
+        # not modified until the table is written
+        res = self.client().get('/actors', headers=self.headers)
+        etag = res.headers['ETag']
+        headers = dict(self.headers, **{'If-None-Match': etag})
+        res = self.client().get('/actors', headers=headers)
+        self.assertEqual(res.status_code, 304)
+
+        # another page has another etag
+        res = self.client().get('/actors?page=2', headers=headers)
+        self.assertEqual(res.status_code, 200)
+
+        # a write changes the etag
+        Actor(name='etag_actor', age=30, gender='F').insert()
+        res = self.client().get('/actors', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+        # writes to other tables do not
+        etag = res.headers['ETag']
+        self.client().patch('/movies/bulk', headers=self.headers,
+                            json={'ids': [1], 'changes': {'title': 'M'}})
+        headers = dict(self.headers, **{'If-None-Match': etag})
+        res = self.client().get('/actors', headers=headers)
+        self.assertEqual(res.status_code, 304)
+
+    def test_get_actors_total_after_other_write(self):
+        res = self.client().get('/actors', headers=self.headers)
+        total = json.loads(res.data)['total']
+
+        # another worker writes: the version is bumped, but the count
+        # cache of this process is not invalidated
+        db.session.execute(Actor.__table__.insert().values(
+            name='other_worker_actor', age=30, gender='F'))
+        db.session.execute(
+            "UPDATE table_version SET version = version + 1 "
+            "WHERE name = 'Actor'")
+        db.session.commit()
+
+        res = self.client().get('/actors', headers=self.headers)
+        self.assertEqual(json.loads(res.data)['total'], total + 1)
+
+    def test_get_movies_cached(self):
+        # a repeated page is served from the response cache
+        self.client().get('/movies?per_page=5', headers=self.headers)
+        hits = response_cache.stats()['hits']
+        res = self.client().get('/movies?per_page=5', headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(response_cache.stats()['hits'], hits + 1)
+        self.assertEqual(len(res.get_json()['movies']), 1)
+
+        # a write invalidates it
+        Movie(title='cached_movie',
+              release_date=format_date('2011-11-11')).insert()
+        res = self.client().get('/movies?per_page=5', headers=self.headers)
+        self.assertEqual(len(res.get_json()['movies']), 2)
+
+    def test_get_movies_compressed(self):
+        # large pages and exports are gzipped
+        Movie.bulk_insert([{'title': f'CompressedMovie{i}',
+                            'release_date': format_date('2001-01-01')}
+                           for i in range(99)])
+        headers = dict(self.headers, **{'Accept-Encoding': 'gzip'})
+        res = self.client().get('/movies?per_page=100', headers=headers)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(res.get_data()))
+        self.assertEqual(len(data['movies']), 100)
+
+        # the weak etag of the compressed page still matches
+        headers['If-None-Match'] = res.headers['ETag']
+        res = self.client().get('/movies?per_page=100', headers=headers)
+        self.assertEqual(res.status_code, 304)
+
+        res = self.client().get('/movies/export', headers=headers)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(res.get_data()).splitlines()
+        self.assertEqual(len(lines), 100)
+
+    def test_error_get_actors_paging(self):
+        # per_page is out of range
+        res = self.client().get('/actors?per_page=1000',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+        # page is not positive
+        res = self.client().get('/actors?page=0', headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
     '''
         POST
     '''
@@ -160,6 +698,171 @@ class ExecutiveProducerTestCase(unittest.TestCase):
         self.assertEqual(res.get_json()['message'],
                          'invalid date format. it must be %Y-%m-%d')
 
+    def test_post_actors_bulk(self):
+        # success
+        req_data = [{'name': f'BulkActor{i}', 'age': 20 + i, 'gender': 'F'}
+                    for i in range(500)]
+        res = self.client().post('/actors/bulk',
+                                 headers=self.headers, json=req_data)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['created'], 500)
+        self.assertEqual(Actor.query.count(), 501)
+
+    def test_error_post_actors_bulk(self):
+        # invalid items are reported and nothing is inserted
+        req_data = {'actors': [
+            {'name': 'BulkActor1', 'age': 30, 'gender': 'F'},
+            {'name': 'BulkActor2', 'age': 'eighty', 'gender': 'M'},
+            {'name': 'BulkActor3', 'age': 30, 'gender': 'MALE'}
+        ]}
+        res = self.client().post('/actors/bulk',
+                                 headers=self.headers, json=req_data)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['errors'], [
+            {'index': 1, 'message': 'age must be Integer'},
+            {'index': 2, 'message': 'gender must be "M" or "F"'}
+        ])
+        self.assertEqual(Actor.query.count(), 1)
+
+        # empty list
+        res = self.client().post('/actors/bulk',
+                                 headers=self.headers, json=[])
+        self.assertEqual(res.status_code, 400)
+
+    def test_error_post_actors_bulk_types(self):
+        # wrong types and lengths are reported by item, not a 500
+        req_data = [
+            {'name': 'BulkActor1', 'age': 30, 'gender': 'F'},
+            {'name': None, 'age': 30, 'gender': 'F'},
+            {'name': 'N' * 101, 'age': 30, 'gender': 'F'},
+            {'name': 'BulkActor4', 'age': 30, 'gender': 5},
+            {'name': 'BulkActor5', 'age': True, 'gender': 'M'},
+            {'name': 'BulkActor6', 'age': 10 ** 12, 'gender': 'M'},
+            {'name': 'BulkActor7', 'age': 40, 'gender': 'm'}
+        ]
+        res = self.client().post('/actors/bulk',
+                                 headers=self.headers, json=req_data)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['errors'], [
+            {'index': 1, 'message': 'name must be a non-empty String'},
+            {'index': 2, 'message': 'name must have at most 100 characters'},
+            {'index': 3, 'message': 'gender must be "M" or "F"'},
+            {'index': 4, 'message': 'age must be Integer'},
+            {'index': 5, 'message': 'age must be at most 2147483647'}
+        ])
+        self.assertEqual(Actor.query.count(), 1)
+
+        # the same checks apply to bulk changes
+        req_data = [{'id': 1, 'changes': {'name': None}},
+                    {'id': 1, 'changes': {'gender': ['F']}}]
+        res = self.client().patch('/actors/bulk',
+                                  headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 400)
+        data = res.get_json()
+        self.assertEqual([error['index'] for error in data['errors']], [0, 1])
+
+    def test_post_movies_bulk(self):
+        # success
+        req_data = {'movies': [
+            {'title': 'BulkMovie1', 'release_date': '2020-12-12'},
+            {'title': 'BulkMovie2', 'release_date': '2021-01-01'}
+        ]}
+        res = self.client().post('/movies/bulk',
+                                 headers=self.headers, json=req_data)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['created'], 2)
+        self.assertEqual(Movie.query.count(), 3)
+
+    def test_error_post_movies_bulk(self):
+        # wrong date format
+        req_data = [{'title': 'BulkMovie1', 'release_date': '20201212'}]
+        res = self.client().post('/movies/bulk',
+                                 headers=self.headers, json=req_data)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['errors'][0]['message'],
+                         'invalid date format. it must be %Y-%m-%d')
+
+        # wrong types and lengths
+        req_data = [{'title': 'BulkMovie1', 'release_date': '2020-12-12'},
+                    {'title': None, 'release_date': '2020-12-12'},
+                    {'title': 'T' * 101, 'release_date': '2020-12-12'},
+                    {'title': 'BulkMovie4', 'release_date': 20201212}]
+        res = self.client().post('/movies/bulk',
+                                 headers=self.headers, json=req_data)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([error['index'] for error in data['errors']],
+                         [1, 2, 3])
+        self.assertEqual(Movie.query.count(), 1)
+
+    def test_import_actors(self):
+        # success (invalid rows are rejected and counted)
+        body = 'name,age,gender\nA1,30,F\nA2,old,M\nA3,40,m\n'
+        res = self.client().post('/actors/import?format=csv&chunk_size=1',
+                                 headers=self.headers, data=body)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['imported'], 2)
+        self.assertEqual(data['rejected'], 1)
+        self.assertEqual(data['committed'], 3)
+        self.assertEqual(data['errors'],
+                         [{'row': 1, 'message': 'age must be Integer'}])
+        self.assertEqual(Actor.query.count(), 3)
+
+    def test_import_movies_resume(self):
+        # rows committed before are skipped
+        body = ''.join(json.dumps({'title': f'Movie{i}',
+                                   'release_date': '2020-12-12'}) + '\n'
+                       for i in range(5))
+        res = self.client().post('/movies/import?resume_from=3',
+                                 headers=self.headers, data=body)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['imported'], 2)
+        self.assertEqual(data['committed'], 5)
+        self.assertEqual([movie.title for movie in Movie.query.all()],
+                         ['first_movie', 'Movie3', 'Movie4'])
+
+    def test_error_import_movies(self):
+        # unknown format
+        res = self.client().post('/movies/import?format=xml',
+                                 headers=self.headers, data='')
+        self.assertEqual(res.status_code, 400)
+
+    def test_import_actors_wrong_types(self):
+        # rows of the wrong types are rejected, not written
+        body = ''.join(json.dumps(row) + '\n' for row in [
+            {'name': 'A1', 'age': 30, 'gender': 'F'},
+            {'name': None, 'age': 30, 'gender': 'F'},
+            {'name': 'A3', 'age': 30, 'gender': 1},
+            {'name': 'A4', 'age': 40, 'gender': 'M'}])
+        res = self.client().post('/actors/import?chunk_size=2',
+                                 headers=self.headers, data=body)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['imported'], 2)
+        self.assertEqual(data['rejected'], 2)
+        self.assertEqual([error['row'] for error in data['errors']], [1, 2])
+        self.assertEqual(Actor.query.count(), 3)
+
+    def test_error_import_actors_unreadable(self):
+        # the rows before an invalid byte are committed and reported
+        body = b'name,age,gender\n' + b''.join(
+            f'Imported{i},30,F\n'.encode('utf-8') for i in range(2000)) + \
+            b'\xff\xfe,30,F\n'
+        res = self.client().post('/actors/import?format=csv&chunk_size=100',
+                                 headers=self.headers, data=body)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 400)
+        self.assertGreater(data['committed'], 0)
+        self.assertEqual(data['imported'], data['committed'])
+        self.assertEqual(Actor.query.count(), 1 + data['imported'])
+
     '''
         PATCH
     '''
@@ -240,10 +943,82 @@ class ExecutiveProducerTestCase(unittest.TestCase):
             f'/movies/{target_id}', headers=self.headers, json=req_data)
         self.assertEqual(res.status_code, 400)
 
+    def test_patch_actors_bulk(self):
+        # success (same changes for all ids)
+        Actor.bulk_insert([{'name': f'BulkActor{i}', 'age': 20,
+                            'gender': 'F'} for i in range(3)])
+        ids = [actor.id for actor in Actor.query.all()]
+        req_data = {'ids': ids + [9999], 'changes': {'age': 41}}
+        res = self.client().patch('/actors/bulk',
+                                  headers=self.headers, json=req_data)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['updated'], ids)
+        self.assertEqual(data['not_found'], [9999])
+        self.assertEqual(Actor.query.filter(Actor.age == 41).count(), 4)
+
+        # success (changes for each id)
+        req_data = [{'id': ids[0], 'changes': {'name': 'Renamed'}},
+                    {'id': ids[1], 'changes': {'gender': 'm'}}]
+        res = self.client().patch('/actors/bulk',
+                                  headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(Actor.query.get(ids[0]).name, 'Renamed')
+        self.assertEqual(Actor.query.get(ids[1]).gender, 'M')
+
+    def test_error_patch_actors_bulk(self):
+        # invalid changes are reported by index
+        target_id = Actor.query.all()[-1].id
+        req_data = [{'id': target_id, 'changes': {'age': -1}},
+                    {'id': 'first', 'changes': {'age': 1}}]
+        res = self.client().patch('/actors/bulk',
+                                  headers=self.headers, json=req_data)
+        data = res.get_json()
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([error['index'] for error in data['errors']],
+                         [0, 1])
+
+        # empty changes
+        req_data = {'ids': [target_id], 'changes': {}}
+        res = self.client().patch('/actors/bulk',
+                                  headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 400)
+
+    def test_patch_movies_bulk(self):
+        # success
+        target_id = Movie.query.all()[-1].id
+        req_data = {'ids': [target_id],
+                    'changes': {'release_date': '2001-01-01'}}
+        res = self.client().patch('/movies/bulk',
+                                  headers=self.headers, json=req_data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            Movie.query.get(target_id).release_date.strftime('%Y-%m-%d'),
+            '2001-01-01')
+
     '''
         DELETE
     '''
 
+    def test_delete_actors_bulk(self):
+        # success
+        Actor.bulk_insert([{'name': f'BulkActor{i}', 'age': 20,
+                            'gender': 'F'} for i in range(3)])
+        ids = [actor.id for actor in Actor.query.all()]
+        res = self.client().delete('/actors/bulk', headers=self.headers,
+                                   json={'ids': ids[:3] + [9999]})
+        data = res.get_json()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], ids[:3])
+        self.assertEqual(data['not_found'], [9999])
+        self.assertEqual(Actor.query.count(), 1)
+
+    def test_error_delete_movies_bulk(self):
+        # ids are missing
+        res = self.client().delete('/movies/bulk', headers=self.headers,
+                                   json={})
+        self.assertEqual(res.status_code, 400)
+
     def test_delete_actors(self):
         # success
         target_id = Actor.query.all()[-1].id
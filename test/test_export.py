@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+import os
+import resource
+import unittest
+from flask_sqlalchemy import SQLAlchemy
+from database.models import (
+    setup_db,
+    db_drop_and_create_all,
+    db,
+    Movie,
+    Actor
+)
+from agency_api import (
+    app,
+    format_date
+)
+from auth.issuer import get_local_issuer
+
+# rows exported by the memory test
+EXPORT_TEST_ROWS = int(os.environ.get('EXPORT_TEST_ROWS', 1000000))
+# growth of the peak RSS allowed while exporting them
+EXPORT_MAX_RSS_GROWTH_MB = 64
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        '''
+            Define test variables and initialize app.
+        '''
+        self.app = app
+        self.client = self.app.test_client
+        setup_db(self.app, database_filename="database_test.db")
+
+        issuer = get_local_issuer()
+        issuer.install()
+        self.headers = {
+            "Authorization": f"Bearer {issuer.role_token('ASSISTANT')}"
+        }
+
+        # binds the app to the current context
+        with self.app.app_context():
+            self.db = SQLAlchemy()
+            self.db.init_app(self.app)
+            # create all tables
+            db_drop_and_create_all()
+
+        # insert sample rows
+        Actor.bulk_insert([{'name': f'actor{i}', 'age': i, 'gender': 'F'}
+                           for i in range(5)])
+        Movie(title='first_movie',
+              release_date=format_date('2010-10-08')).insert()
+
+    def tearDown(self):
+        pass
+
+    def test_export_actors_ndjson(self):
+        # success
+        res = self.client().get('/actors/export', headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        actors = [json.loads(line)
+                  for line in res.get_data(as_text=True).splitlines()]
+        self.assertEqual([actor['name'] for actor in actors],
+                         [f'actor{i}' for i in range(5)])
+
+    def test_export_movies_csv(self):
+        # success
+        res = self.client().get('/movies/export?format=csv',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'text/csv')
+        rows = list(csv.reader(io.StringIO(res.get_data(as_text=True))))
+        self.assertEqual(rows, [['id', 'title', 'release_date'],
+                                ['1', 'first_movie', '2010-10-08']])
+
+    def test_error_export_actors(self):
+        # unknown format
+        res = self.client().get('/actors/export?format=xml',
+                                headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+        # no permission (w/o headers)
+        res = self.client().get('/actors/export')
+        self.assertEqual(res.status_code, 401)
+
+    def test_export_memory(self):
+        # the peak RSS stays bounded whatever the table size
+        chunk = 5000
+        with self.app.app_context():
+            for start in range(0, EXPORT_TEST_ROWS, chunk):
+                db.session.execute(Actor.__table__.insert(), [
+                    {'name': f'actor{i}', 'age': i % 90, 'gender': 'M'}
+                    for i in range(start, min(start + chunk,
+                                              EXPORT_TEST_ROWS))
+                ])
+            db.session.commit()
+            db.session.remove()
+
+        before = peak_rss_mb()
+        res = self.client().get('/actors/export', headers=self.headers,
+                                buffered=False)
+        self.assertEqual(res.status_code, 200)
+        lines = 0
+        for chunk in res.response:
+            lines += chunk.count(b'\n')
+        res.close()
+
+        self.assertEqual(lines, EXPORT_TEST_ROWS + 5)
+        self.assertLess(peak_rss_mb() - before, EXPORT_MAX_RSS_GROWTH_MB)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import datetime
+import os
+import unittest
+from sqlalchemy import event
+from database.models import (
+    setup_db,
+    db_drop_and_create_all,
+    db
+)
+from database.pagination import encode_cursor
+from agency_api import (
+    app,
+    response_cache
+)
+from auth.issuer import get_local_issuer
+
+# EXPLAIN of a list request: (url, index it must use, sort value of
+# a cursor page)
+PLANS = [
+    ('/actors?gender=F&min_age=20&max_age=40&sort=age',
+     'ix_actor_gender_age_id', 30),
+    ('/actors?min_age=20&max_age=40&sort=-age', 'ix_actor_age_id', 30),
+    ('/actors?sort=name', 'ix_actor_name_id', 'actor'),
+    ('/movies?min_release_date=2000-01-01&max_release_date=2010-12-31'
+     '&sort=-release_date', 'ix_movie_release_date_id',
+     datetime.date(2005, 1, 1)),
+    ('/movies?sort=title', 'ix_movie_title_id', 'movie')
+]
+
+
+class SQLiteIndexTestCase(unittest.TestCase):
+    database_filename = 'database_test.db'
+
+    def setUp(self):
+        '''
+            Define test variables and initialize app.
+        '''
+        setup_db(app, database_filename=self.database_filename)
+        with app.app_context():
+            db_drop_and_create_all()
+        response_cache.clear()
+        issuer = get_local_issuer()
+        issuer.install()
+        self.headers = {
+            'Authorization': f"Bearer {issuer.role_token('ASSISTANT')}"
+        }
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def page_statement(self, url):
+        # the page select (ORDER BY ... LIMIT) run by a list request
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context,
+                    executemany):
+            if 'ORDER BY' in statement and 'LIMIT' in statement:
+                statements.append((statement, parameters))
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            res = app.test_client().get(url, headers=self.headers)
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        self.assertEqual(res.status_code, 200, url)
+        self.assertEqual(len(statements), 1, url)
+        return statements[0]
+
+    def explain(self, statement, parameters):
+        connection = db.session.connection()
+        rows = connection.execute(f'EXPLAIN QUERY PLAN {statement}',
+                                  parameters)
+        return '\n'.join(row[-1] for row in rows)
+
+    def test_indexes(self):
+        # every filter and sort of the list endpoints uses its index,
+        # for numbered pages and cursor pages
+        for url, index, value in PLANS:
+            sort = url.split('sort=')[1]
+            cursor = encode_cursor(sort, value, 1)
+            for page_url in (url, f'{url}&page=3', f'{url}&cursor=',
+                             f'{url}&cursor={cursor}'):
+                with app.app_context():
+                    plan = self.explain(*self.page_statement(page_url))
+                self.assertIn(index, plan, f'{page_url}\n{plan}')
+
+
+@unittest.skipUnless(
+    os.environ.get('DATABASE_URI', '').startswith('postgres'),
+    'DATABASE_URI is not a postgres database')
+class PostgresIndexTestCase(SQLiteIndexTestCase):
+    database_filename = None
+
+    def explain(self, statement, parameters):
+        connection = db.session.connection()
+        # tiny test tables would rather be scanned
+        connection.execute('SET LOCAL enable_seqscan = off')
+        rows = connection.execute(f'EXPLAIN {statement}', parameters)
+        return '\n'.join(row[0] for row in rows)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
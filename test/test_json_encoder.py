@@ -0,0 +1,61 @@
+import datetime
+import json
+import unittest
+from flask import Flask
+from utils import json_encoder
+from utils.json_encoder import (
+    dumps,
+    jsonify
+)
+
+
+class JSONEncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = json_encoder.JSON_ENCODER
+
+    def tearDown(self):
+        json_encoder.JSON_ENCODER = self.encoder
+
+    def test_dumps(self):
+        # compact, sorted, UTF-8 and ISO 8601 dates
+        value = {'title': 'Amélie',
+                 'release_date': datetime.date(2001, 4, 25),
+                 'id': 1}
+        self.assertEqual(dumps(value),
+                         '{"id":1,"release_date":"2001-04-25",'
+                         '"title":"Amélie"}'.encode('utf-8'))
+        self.assertEqual(dumps(value, sort_keys=False),
+                         '{"title":"Amélie","release_date":"2001-04-25",'
+                         '"id":1}'.encode('utf-8'))
+
+    @unittest.skipUnless(json_encoder.orjson, 'orjson is not installed')
+    def test_dumps_encoders(self):
+        # orjson and the stdlib write the same bytes
+        value = [{'id': id, 'name': f'actor{id}', 'age': 30, 'ok': True,
+                  'at': datetime.datetime(2020, 1, 2, 3, 4, 5),
+                  'missing': None} for id in range(10)]
+        json_encoder.JSON_ENCODER = 'orjson'
+        fast = dumps(value)
+        json_encoder.JSON_ENCODER = 'json'
+        self.assertEqual(fast, dumps(value))
+
+    def test_error_dumps(self):
+        # not serializable
+        with self.assertRaises(TypeError):
+            dumps({'value': object()})
+
+    def test_jsonify(self):
+        # a JSON response like flask.jsonify
+        with Flask(__name__).app_context():
+            response = jsonify({'success': True})
+            self.assertEqual(response.mimetype, 'application/json')
+            self.assertEqual(response.get_data(), b'{"success":true}\n')
+            response = jsonify(success=True, count=2)
+            self.assertEqual(json.loads(response.get_data()),
+                             {'success': True, 'count': 2})
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import time
+import unittest
+from Crypto.PublicKey import RSA
+from jose import jwk
+from auth.jwks import JWKSCache
+
+
+def make_jwk(kid):
+    pem = RSA.generate(2048).publickey().export_key()
+    key = jwk.construct(pem, 'RS256').to_dict()
+    key.update({'kid': kid, 'use': 'sig'})
+    return key
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.first_key = make_jwk('first')
+        cls.second_key = make_jwk('second')
+
+    def setUp(self):
+        '''
+            Define a fetcher which counts the JWKS downloads
+        '''
+        self.fetches = 0
+        self.jwks = {'keys': [self.first_key]}
+        self.failing = False
+
+        def fetcher():
+            self.fetches += 1
+            if self.failing:
+                raise OSError('identity provider is down')
+            return self.jwks
+
+        self.fetcher = fetcher
+
+    def test_get_key(self):
+        # keys are fetched once and served from memory
+        cache = JWKSCache(self.fetcher)
+        for _ in range(5):
+            self.assertIsNotNone(cache.get_key('first'))
+        self.assertEqual(self.fetches, 1)
+
+    def test_unknown_kid_refresh(self):
+        # an unknown kid forces a refresh
+        cache = JWKSCache(self.fetcher, min_refresh_interval=0)
+        self.assertIsNotNone(cache.get_key('first'))
+        self.jwks = {'keys': [self.first_key, self.second_key]}
+        self.assertIsNotNone(cache.get_key('second'))
+        self.assertEqual(self.fetches, 2)
+
+    def test_unknown_kid_rate_limit(self):
+        # forced refreshes are rate limited
+        cache = JWKSCache(self.fetcher, min_refresh_interval=60)
+        for _ in range(5):
+            self.assertIsNone(cache.get_key('unknown'))
+        self.assertEqual(self.fetches, 1)
+
+    def test_stale_keys_refresh_in_background(self):
+        # expired keys are served while they are fetched again
+        cache = JWKSCache(self.fetcher, ttl=0)
+        self.assertIsNotNone(cache.get_key('first'))
+        self.failing = True
+        self.assertIsNotNone(cache.get_key('first'))
+        for _ in range(100):
+            if self.fetches == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.fetches, 2)
+        self.assertIsNotNone(cache.get_key('first'))
+
+    def test_circuit_breaker(self):
+        # fetching stops after consecutive failures
+        self.failing = True
+        cache = JWKSCache(self.fetcher, min_refresh_interval=0,
+                          failure_threshold=2, breaker_reset=60)
+        for _ in range(5):
+            self.assertIsNone(cache.get_key('first'))
+        self.assertEqual(self.fetches, 2)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
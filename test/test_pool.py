@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError
+from database.pool import (
+    MeteredNullPool,
+    MeteredQueuePool,
+    engine_options,
+    pool_stats,
+    warm_pool
+)
+
+
+class PoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_postgres_options(self):
+        options = engine_options('postgres://user@localhost/agency')
+        self.assertIs(options['poolclass'], MeteredQueuePool)
+        for name in ('pool_size', 'max_overflow', 'pool_timeout',
+                     'pool_recycle', 'pool_pre_ping'):
+            self.assertIn(name, options)
+        self.assertEqual(options['connect_args']['application_name'],
+                         'agency_api')
+        self.assertIn('statement_timeout',
+                      options['connect_args']['options'])
+
+    def test_sqlite_options(self):
+        self.assertEqual(engine_options('sqlite://'), {})
+        self.assertEqual(engine_options(f'sqlite:///{self.path}'),
+                         {'poolclass': MeteredNullPool})
+
+    def test_saturation_and_timeout(self):
+        engine = create_engine(f'sqlite:///{self.path}',
+                               poolclass=MeteredQueuePool,
+                               pool_size=1, max_overflow=1, pool_timeout=0.05,
+                               connect_args={'check_same_thread': False})
+        first = engine.connect()
+        self.assertEqual(pool_stats(engine)['saturation'], 0.5)
+        second = engine.connect()
+        self.assertEqual(pool_stats(engine)['saturation'], 1.0)
+        with self.assertRaises(TimeoutError):
+            engine.connect()
+
+        stats = pool_stats(engine)
+        self.assertEqual(stats['pool'], 'MeteredQueuePool')
+        self.assertEqual(stats['checkouts'], 3)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreaterEqual(stats['wait_ms_max'], 50)
+        first.close()
+        second.close()
+        self.assertEqual(pool_stats(engine)['checked_out'], 0)
+
+        # the counters survive dispose(), which replaces the pool
+        engine.dispose()
+        self.assertEqual(pool_stats(engine)['checkouts'], 3)
+
+    def test_warm_pool(self):
+        engine = create_engine(f'sqlite:///{self.path}',
+                               poolclass=MeteredQueuePool, pool_size=3,
+                               connect_args={'check_same_thread': False})
+        self.assertEqual(warm_pool(engine, 3), 3)
+        # the connections stay open in the pool
+        self.assertEqual(engine.pool.checkedin(), 3)
+        self.assertEqual(pool_stats(engine)['checked_out'], 0)
+
+    def test_null_pool(self):
+        engine = create_engine(f'sqlite:///{self.path}',
+                               **engine_options(f'sqlite:///{self.path}'))
+        engine.execute('SELECT 1')
+        stats = pool_stats(engine)
+        self.assertEqual(stats['pool'], 'MeteredNullPool')
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertNotIn('saturation', stats)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
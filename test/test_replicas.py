@@ -0,0 +1,147 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import json
+from flask import g
+from sqlalchemy import select
+from database.models import (
+    setup_db,
+    db_drop_and_create_all,
+    db,
+    project_dir,
+    Actor
+)
+from database.replicas import (
+    LAST_WRITE_HEADER,
+    setup_replicas
+)
+from agency_api import app
+from auth.issuer import get_local_issuer
+from test.server_mode import serve
+
+
+class ReplicaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = serve(app)
+        self.client = self.app.test_client
+        setup_db(self.app, database_filename="database_test.db")
+        with self.app.app_context():
+            db_drop_and_create_all()
+            Actor(name='first_actor', age=30, gender='M').insert()
+            db.session.remove()
+
+        # two replicas, copies of the primary at this point
+        self.paths = []
+        for _ in range(2):
+            fd, path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            shutil.copyfile(
+                os.path.join(project_dir, 'database_test.db'), path)
+            self.paths.append(path)
+        setup_db(self.app, database_filename="database_test.db",
+                 replica_uris=[f'sqlite:///{path}' for path in self.paths])
+        self.router = self.app.extensions['db_replicas']
+
+        issuer = get_local_issuer()
+        issuer.install()
+        self.producer = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {issuer.role_token('PRODUCER')}"
+        }
+        self.director = {
+            "Authorization": f"Bearer {issuer.role_token('DIRECTOR')}"
+        }
+
+    def tearDown(self):
+        setup_db(self.app, database_filename="database_test.db")
+        for path in self.paths:
+            os.remove(path)
+
+    def actor_names(self, headers, client=None):
+        res = (client or self.client()).get('/actors', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        return [actor['name'] for actor in json.loads(res.data)['actors']]
+
+    def test_round_robin(self):
+        engines = [self.router.next_engine() for _ in range(4)]
+        self.assertEqual(engines, self.router.engines * 2)
+        self.assertIsNot(engines[0], engines[1])
+
+    def test_reads_from_replica(self):
+        for path in self.paths:
+            with sqlite3.connect(path) as connection:
+                connection.execute(
+                    "INSERT INTO \"Actor\" (name, age, gender) "
+                    "VALUES ('replica_actor', 40, 'F')")
+        self.assertIn('replica_actor', self.actor_names(self.director))
+
+        res = self.client().get('/actors/search?q=replica',
+                                headers=self.director)
+        self.assertEqual(
+            [actor['name'] for actor in json.loads(res.data)['actors']],
+            ['replica_actor'])
+
+    def test_read_your_writes(self):
+        # the client keeps the cookie of the write
+        client = self.client()
+        res = client.post('/actors', headers=self.producer, json={
+            'name': 'new_actor', 'age': 25, 'gender': 'F'})
+        self.assertEqual(res.status_code, 200)
+        token = res.headers[LAST_WRITE_HEADER]
+
+        # the writer reads the primary, the others the replicas
+        self.assertIn('new_actor', self.actor_names(self.producer, client))
+        self.assertNotIn('new_actor', self.actor_names(self.director))
+        # clients without cookies send the header back
+        self.assertIn('new_actor', self.actor_names(
+            dict(self.producer, **{LAST_WRITE_HEADER: token})))
+        # the token is bound to the subject of the write
+        self.assertNotIn('new_actor', self.actor_names(
+            dict(self.director, **{LAST_WRITE_HEADER: token})))
+
+        # after the window, the writer reads the replicas again
+        self.router.window = 0
+        self.assertNotIn('new_actor', self.actor_names(self.producer, client))
+
+    def test_read_your_writes_across_workers(self):
+        # two workers: the read is served by another router than the
+        # one of the write, sharing only the secret key
+        self.app.secret_key = 'shared-secret'
+        try:
+            setup_replicas(self.app, [f'sqlite:///{path}'
+                                      for path in self.paths])
+            client = self.client()
+            res = client.post('/actors', headers=self.producer, json={
+                'name': 'new_actor', 'age': 25, 'gender': 'F'})
+            self.assertEqual(res.status_code, 200)
+
+            setup_replicas(self.app, [f'sqlite:///{path}'
+                                      for path in self.paths])
+            self.assertIsNot(self.app.extensions['db_replicas'],
+                             self.router)
+            self.assertIn('new_actor', self.actor_names(self.producer,
+                                                        client))
+
+            # a token signed with another key is ignored
+            forged = self.router.write_token('local-issuer|producer')
+            self.assertNotIn('new_actor', self.actor_names(
+                dict(self.producer, **{LAST_WRITE_HEADER: forged})))
+        finally:
+            self.app.secret_key = None
+
+    def test_writes_use_primary(self):
+        with self.app.test_request_context():
+            g.db_replica = self.router.engines[0]
+            self.assertIs(db.session.get_bind(
+                clause=select([Actor.__table__])), self.router.engines[0])
+            self.assertIs(db.session.get_bind(
+                clause=Actor.__table__.insert()), db.engine)
+            db.session.remove()
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
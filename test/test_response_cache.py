@@ -0,0 +1,111 @@
+import os
+import tempfile
+import time
+import unittest
+from utils.response_cache import (
+    MemoryBackend,
+    ResponseCache,
+    SQLiteBackend,
+    create_response_cache
+)
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    def tearDown(self):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_memory_backend(self):
+        # hits, misses and the hit ratio are counted
+        cache = ResponseCache(MemoryBackend(maxsize=4))
+        cache.set(['Actor'], 'page1', b'body')
+        self.assertEqual(cache.get(['Actor'], 'page1'), b'body')
+        self.assertIsNone(cache.get(['Actor'], 'page2'))
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_memory_backend_lru(self):
+        # the least recently used entry is evicted
+        cache = ResponseCache(MemoryBackend(maxsize=2))
+        cache.set(['Actor'], 'page1', b'1')
+        cache.set(['Actor'], 'page2', b'2')
+        cache.get(['Actor'], 'page1')
+        cache.set(['Actor'], 'page3', b'3')
+        self.assertIsNone(cache.get(['Actor'], 'page2'))
+        self.assertEqual(cache.get(['Actor'], 'page1'), b'1')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl(self):
+        # an entry expires after the ttl
+        cache = ResponseCache(MemoryBackend(), ttl=0)
+        cache.set(['Actor'], 'page1', b'body')
+        time.sleep(0.01)
+        self.assertIsNone(cache.get(['Actor'], 'page1'))
+
+    def test_invalidate(self):
+        # a write to a table drops its entries only
+        for backend in (MemoryBackend(), SQLiteBackend(self.path)):
+            cache = ResponseCache(backend)
+            cache.set(['Actor'], 'page1', b'actors')
+            cache.set(['Movie'], 'page1', b'movies')
+            cache.set(['Actor', 'Movie'], 'page1', b'both')
+            cache.invalidate('Actor')
+            self.assertIsNone(cache.get(['Actor'], 'page1'))
+            self.assertIsNone(cache.get(['Actor', 'Movie'], 'page1'))
+            self.assertEqual(cache.get(['Movie'], 'page1'), b'movies')
+
+    def test_sqlite_backend_shared(self):
+        # workers share the entries of the same file
+        worker1 = ResponseCache(SQLiteBackend(self.path))
+        worker2 = ResponseCache(SQLiteBackend(self.path))
+        worker1.set(['Actor'], 'page1', b'body')
+        self.assertEqual(worker2.get(['Actor'], 'page1'), b'body')
+        worker2.invalidate('Actor')
+        self.assertIsNone(worker1.get(['Actor'], 'page1'))
+
+    def test_sqlite_backend_eviction(self):
+        # the file keeps at most maxsize entries
+        backend = SQLiteBackend(self.path, maxsize=10)
+        cache = ResponseCache(backend)
+        for i in range(SQLiteBackend.SWEEP_INTERVAL):
+            cache.set(['Actor'], f'page{i}', b'body')
+        self.assertEqual(backend.size(), 10)
+        self.assertEqual(cache.stats()['evictions'],
+                         SQLiteBackend.SWEEP_INTERVAL - 10)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'os.fork is not available')
+    def test_sqlite_backend_fork(self):
+        # a forked worker opens its own connection
+        backend = SQLiteBackend(self.path)
+        backend.set('parent', b'1', 60)
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                backend.set('child', b'2', 60)
+                ok = backend.get('parent') == b'1' and \
+                    len(backend._inherited) == 1
+            finally:
+                os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertEqual(backend.get('child'), b'2')
+        self.assertEqual(backend._inherited, [])
+
+    def test_error_create_response_cache(self):
+        # unknown backend
+        with self.assertRaises(ValueError):
+            create_response_cache('redis')
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
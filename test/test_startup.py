@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from agency_api import (
+    app,
+    create_app
+)
+from auth.auth import get_auth_config
+from auth.issuer import get_local_issuer
+from database.models import (
+    setup_db,
+    db_drop_and_create_all,
+    db,
+    Actor
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(args, **env):
+    environ = {'PATH': os.environ.get('PATH', ''), 'PYTHONPATH': ROOT}
+    environ.update(env)
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=environ,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+class StartupTestCase(unittest.TestCase):
+
+    def test_import_without_environment(self):
+        # no AUTH0_DOMAIN, ALGORITHMS, API_AUDIENCE nor DATABASE_URI
+        result = run_python(['-c', 'import agency_api'])
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_startup_budget(self):
+        # bench_startup.py exits with 1 when a budget is exceeded
+        result = run_python(['bench/bench_startup.py', '1'])
+        self.assertEqual(result.returncode, 0,
+                         result.stdout + result.stderr)
+
+    def test_create_app(self):
+        config = get_auth_config()
+        other = create_app({'DATABASE_FILENAME': 'database_test.db',
+                            'AUTH0_DOMAIN': config['domain'],
+                            'API_AUDIENCE': config['audience'],
+                            'ALGORITHMS': 'RS256'})
+        self.assertIsNot(other, app)
+        self.assertEqual(get_auth_config()['algorithms'], ['RS256'])
+        with other.app_context():
+            db_drop_and_create_all()
+            Actor(name='first_actor', age=30, gender='M').insert()
+            db.session.remove()
+
+        issuer = get_local_issuer()
+        issuer.install()
+        res = other.test_client().get('/actors', headers={
+            'Authorization': f"Bearer {issuer.role_token('ASSISTANT')}",
+            'Origin': 'https://example.com'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['total'], 1)
+        self.assertIn('Access-Control-Allow-Origin', res.headers)
+        self.assertIn('Access-Control-Allow-Methods', res.headers)
+
+        # the error handlers are registered on the application
+        res = other.test_client().get('/unknown')
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(json.loads(res.data)['message'],
+                         'resource not found')
+        setup_db(app, database_filename="database_test.db")
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
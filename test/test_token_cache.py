@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+from auth.token_cache import TokenCache
+
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.payload = {'sub': 'user', 'exp': time.time() + 60}
+
+    def test_get(self):
+        # a cached token is a hit, an unknown one a miss
+        cache = TokenCache(maxsize=4)
+        cache.put('token', self.payload)
+        self.assertEqual(cache.get('token'), self.payload)
+        self.assertIsNone(cache.get('other'))
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_expired(self):
+        # a token is dropped at its exp
+        cache = TokenCache(maxsize=4)
+        cache.put('token', {'sub': 'user', 'exp': time.time() - 1})
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_without_exp(self):
+        # a token without exp is not cached
+        cache = TokenCache(maxsize=4)
+        cache.put('token', {'sub': 'user'})
+        self.assertIsNone(cache.get('token'))
+
+    def test_lru_eviction(self):
+        # the least recently used token is evicted
+        cache = TokenCache(maxsize=2)
+        cache.put('first', self.payload)
+        cache.put('second', self.payload)
+        cache.get('first')
+        cache.put('third', self.payload)
+        self.assertIsNotNone(cache.get('first'))
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('third'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_threads(self):
+        # counters stay consistent under concurrent use
+        cache = TokenCache(maxsize=8)
+
+        def work(n):
+            for i in range(500):
+                token = f'token{(n + i) % 16}'
+                if cache.get(token) is None:
+                    cache.put(token, self.payload)
+
+        threads = [threading.Thread(target=work, args=(n,))
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 8 * 500)
+        self.assertLessEqual(stats['size'], 8)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
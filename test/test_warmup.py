@@ -0,0 +1,63 @@
+import logging
+import os
+import runpy
+import unittest
+from database.models import (
+    setup_db,
+    db_drop_and_create_all,
+    db,
+    _count_cache,
+    Actor
+)
+from agency_api import (
+    app,
+    warmup
+)
+from auth.auth import jwks_cache
+from auth.issuer import get_local_issuer
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+
+class FakeWorker():
+    pid = os.getpid()
+    log = logging.getLogger('gunicorn.test')
+
+
+class WarmupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        setup_db(app, database_filename="database_test.db")
+        with app.app_context():
+            db_drop_and_create_all()
+            Actor(name='first_actor', age=30, gender='M').insert()
+            db.session.remove()
+        get_local_issuer().install()
+
+    def test_warmup(self):
+        _count_cache.clear()
+        timings = warmup(connections=2)
+        self.assertEqual(set(timings), {'jwks', 'pool', 'queries'})
+        # the signing keys are cached and the list counts too
+        self.assertIsNotNone(jwks_cache.get_key(get_local_issuer().kid))
+        self.assertTrue(_count_cache)
+
+    def test_config(self):
+        config = runpy.run_path(CONFIG)
+        self.assertTrue(config['preload_app'])
+        self.assertGreaterEqual(config['workers'], 1)
+        self.assertIn(config['worker_class'], ('sync', 'gthread'))
+
+        # the hooks of a worker: drop the inherited pool, then warm up
+        with app.app_context():
+            pool = db.engine.pool
+        config['post_fork'](None, FakeWorker())
+        with app.app_context():
+            self.assertIsNot(db.engine.pool, pool)
+        config['post_worker_init'](FakeWorker())
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import os
+import zlib
+from flask import request
+
+'''
+Response compression
+    an after_request hook which compresses responses with the best
+    encoding of Accept-Encoding: br (when brotli is installed) or gzip.
+        bodies under COMPRESSION_MIN_SIZE bytes are sent as they are
+        streamed responses are compressed chunk by chunk, each chunk
+            flushed, so clients still receive them as they are produced
+        responses tagged by conditional_get have their compressed body
+            cached in the response cache next to the plain one
+    the ETag of a compressed response is made weak, like nginx does,
+    so If-None-Match still matches it.
+'''
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+COMPRESSIBLE_MIMETYPES = set([
+    'application/json',
+    'application/x-ndjson',
+    'text/csv',
+    'text/html',
+    'text/plain'
+])
+
+'''
+available_encodings()
+    the encodings the server can write, preferred first
+'''
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+'''
+negotiate_encoding(accept_encodings)
+    returns the best encoding of an Accept-Encoding header
+    (werkzeug Accept) or None for identity
+'''
+
+
+def negotiate_encoding(accept_encodings):
+    return accept_encodings.best_match(available_encodings())
+
+
+'''
+Compressor(encoding)
+    compresses a stream of chunks
+        compress(chunk): compressed bytes available so far
+        finish(): the remaining compressed bytes
+'''
+
+
+class Compressor():
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits 31: gzip container (with mtime 0)
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + \
+            self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+'''
+compress(body, encoding)
+    returns the whole body compressed
+'''
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_chunks(chunks, encoding, charset='utf-8'):
+    compressor = Compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            if chunk:
+                compressed = compressor.compress(chunk)
+                if compressed:
+                    yield compressed
+        yield compressor.finish()
+    finally:
+        # let the wrapped generator clean up (e.g. its request context)
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+'''
+install_compression(app, cache=None)
+    compresses the responses of app
+    cache: the ResponseCache of the responses tagged by conditional_get
+        (response.cache_tags = (tables, key))
+'''
+
+
+def install_compression(app, cache=None):
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code != 304 and \
+                response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if response.status_code < 200 or \
+                response.status_code in (204, 304) or \
+                response.direct_passthrough or \
+                'Content-Encoding' in response.headers:
+            return response
+
+        encoding = negotiate_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_chunks(
+                response.response, encoding, response.charset)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < COMPRESSION_MIN_SIZE:
+                return response
+            tags = getattr(response, 'cache_tags', None)
+            compressed = None
+            if tags is not None and cache is not None:
+                tables, key = tags
+                compressed = cache.get(tables, f'{key}:{encoding}')
+            if compressed is None:
+                compressed = compress(body, encoding)
+                if tags is not None and cache is not None:
+                    cache.set(tables, f'{key}:{encoding}', compressed)
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return compress_response
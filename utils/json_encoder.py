@@ -0,0 +1,68 @@
+import datetime
+import json
+import os
+from flask import current_app
+
+'''
+JSON encoder
+    every response body is serialized by dumps(): orjson when it is
+    installed (pip install orjson), the stdlib json otherwise.
+    both write compact UTF-8 with sorted keys, and date / datetime
+    values as ISO 8601 strings, so models can hand them over as they are.
+
+    JSON_ENCODER=json forces the stdlib encoder
+'''
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+JSON_ENCODER = os.environ.get('JSON_ENCODER',
+                              'orjson' if orjson is not None else 'json')
+if JSON_ENCODER not in ('orjson', 'json'):
+    raise ValueError(f'unknown json encoder: {JSON_ENCODER}')
+if JSON_ENCODER == 'orjson' and orjson is None:
+    raise ValueError('JSON_ENCODER is orjson but orjson is not installed')
+
+
+def default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+'''
+dumps(obj, sort_keys=True)
+    returns obj as JSON (bytes)
+    sort_keys=False keeps the insertion order of the keys
+'''
+
+
+def dumps(obj, sort_keys=True):
+    if JSON_ENCODER == 'orjson':
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS
+                            if sort_keys else 0)
+    return json.dumps(obj, sort_keys=sort_keys, ensure_ascii=False,
+                      separators=(',', ':'), default=default) \
+        .encode('utf-8')
+
+
+'''
+jsonify(*args, **kwargs)
+    a drop-in replacement of flask.jsonify which serializes with dumps()
+    EXAMPLE
+        return jsonify({"success": True}), 201
+'''
+
+
+def jsonify(*args, **kwargs):
+    if args and kwargs:
+        raise TypeError('jsonify() takes either args or kwargs, not both')
+    if len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+
+    return current_app.response_class(
+        dumps(data) + b'\n', mimetype='application/json')
@@ -0,0 +1,250 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+'''
+Response cache
+    a bounded LRU cache with TTL for response bodies.
+    entries are tagged with the tables they were read from, and
+    invalidate(table) drops every entry of a table.
+
+    backends
+        MemoryBackend: in-process (default)
+        SQLiteBackend: a SQLite file shared by all the workers of a host
+'''
+
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+RESPONSE_CACHE_PATH = os.environ.get(
+    'RESPONSE_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'agency_response_cache.db'))
+
+
+class MemoryBackend():
+    '''
+    stores entries in an OrderedDict (least recently used first)
+    '''
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete_matching(self, fragment):
+        with self._lock:
+            for key in [key for key in self._entries if fragment in key]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class SQLiteBackend():
+    '''
+    stores entries in a SQLite file, so gunicorn workers share them
+    every process counts its own evictions
+    '''
+
+    # how many sets between two sweeps of expired and excess entries
+    SWEEP_INTERVAL = 64
+
+    def __init__(self, path=RESPONSE_CACHE_PATH,
+                 maxsize=RESPONSE_CACHE_SIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._local = threading.local()
+        self._sets = 0
+        # connections of the parent process, never closed by a child
+        # (that would release the parent's file locks)
+        self._inherited = []
+
+    def _connection(self):
+        # sqlite3 connections can not be shared between threads, nor
+        # between processes: a forked worker (gunicorn preload_app)
+        # opens its own instead of the one it inherited
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            if connection is not None:
+                self._inherited.append(connection)
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                'expires REAL NOT NULL, accessed REAL NOT NULL)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT value FROM response_cache '
+            'WHERE key = ? AND expires > ?', (key, now)).fetchone()
+        if row is None:
+            return None
+        connection.execute(
+            'UPDATE response_cache SET accessed = ? WHERE key = ?',
+            (now, key))
+        return bytes(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO response_cache '
+            '(key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+            (key, sqlite3.Binary(value), now + ttl, now))
+        self._sets += 1
+        if self._sets % self.SWEEP_INTERVAL == 0:
+            self._sweep(now)
+
+    def _sweep(self, now):
+        connection = self._connection()
+        connection.execute(
+            'DELETE FROM response_cache WHERE expires <= ?', (now,))
+        excess = self.size() - self.maxsize
+        if excess > 0:
+            cursor = connection.execute(
+                'DELETE FROM response_cache WHERE key IN ('
+                'SELECT key FROM response_cache '
+                'ORDER BY accessed LIMIT ?)', (excess,))
+            self.evictions += cursor.rowcount
+
+    def delete_matching(self, fragment):
+        self._connection().execute(
+            "DELETE FROM response_cache WHERE instr(key, ?) > 0",
+            (fragment,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM response_cache')
+
+    def size(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+
+class ResponseCache():
+    '''
+    backend: MemoryBackend, SQLiteBackend or None (disabled)
+    '''
+
+    def __init__(self, backend, ttl=RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    '''
+    make_key(tables, key)
+        a cache key of the tables a response is read from
+    '''
+
+    @staticmethod
+    def make_key(tables, key):
+        return '|{}|:{}'.format('|'.join(sorted(tables)), key)
+
+    def get(self, tables, key):
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(self.make_key(tables, key))
+        except Exception:
+            print(sys.exc_info())
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, tables, key, value):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(self.make_key(tables, key), value, self.ttl)
+        except Exception:
+            print(sys.exc_info())
+
+    '''
+    invalidate(table)
+        drops every cached response read from the table
+    '''
+
+    def invalidate(self, table):
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete_matching(f'|{table}|')
+        except Exception:
+            print(sys.exc_info())
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': type(self.backend).__name__
+            if self.backend is not None else None,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+            'evictions': getattr(self.backend, 'evictions', 0),
+            'size': self.backend.size() if self.backend is not None else 0
+        }
+
+
+'''
+create_response_cache(backend)
+    returns a ResponseCache with the named backend
+    ('memory', 'sqlite' or 'none')
+'''
+
+
+def create_response_cache(backend=RESPONSE_CACHE_BACKEND):
+    if backend == 'memory':
+        return ResponseCache(MemoryBackend())
+    if backend == 'sqlite':
+        return ResponseCache(SQLiteBackend())
+    if backend == 'none':
+        return ResponseCache(None)
+    raise ValueError(f'unknown response cache backend: {backend}')